@@ -1,15 +1,29 @@
-from random import shuffle
+import math
+import random
+import time
+from dataclasses import dataclass, replace
+from typing import List, Dict, Optional, Union, Tuple
 
-from action import NoneAction
-from game import Game
-from tile import Tile
+from action import Action, Build, NoneAction
+from game import Game, UndoRecord, VICTORY_POINTS_TO_WIN
+from tile import Tile, RESOURCE_TYPES
 from player import Player
+from structure import Structure
 from constants import RESOURCE_VALUES
-from util import estimate_roll_probability
+from transposition import TranspositionTable
+from parallel import get_pool, dump_game, search_in_worker
+from evaluation import evaluate_features, evaluate_batch
+from searchStats import SearchStats
+from util import roll_dice, estimate_roll_probability
 
 class Agent(Player):
-    def __init__(self, name: str, color: (int, int, int)):
+    def __init__(self, name: str, color: (int, int, int), rng: Optional[random.Random] = None):
+        """
+        :param rng: Where the agent's randomness comes from (shuffling actions, dice it rolls while searching).
+                    Seed it to replay a game, random if not given.
+        """
         super().__init__(name, color)
+        self.rng = rng if rng is not None else random.Random()
 
     def get_action(self, game: Game):
         raise NotImplementedError
@@ -17,10 +31,286 @@ class Agent(Player):
     def evaluation_function(self, game: Game):
         raise NotImplementedError
 
+    def search_stats(self) -> Optional[SearchStats]:
+        """
+        :return: What the agent's last get_action did, or None if the agent doesn't search.
+        """
+        return None
+
+@dataclass
+class SearchBudget:
+    """
+    How much a search agent can spend on one move. The agent searches depth 1, 2, ... (iterative deepening)
+    and returns the result of the deepest search that finished before the budget ran out.
+    Depth 1 always finishes, so there is always an action to return. The budget is only checked once it has, so a
+    move can go over time_limit (or node_limit) by however long depth 1 takes.
+    """
+    # Wall clock seconds per move, or None for no limit.
+    time_limit: Optional[float] = None
+    # Expanded nodes per move, or None for no limit.
+    node_limit: Optional[int] = None
+    # Deepest search to try.
+    max_depth: int = 8
+
+class SearchBudgetExceeded(Exception):
+    """
+    Raised inside a search to stop it once the move's budget is spent.
+    """
+    pass
+
 class MultiAgent(Agent):
-    def __init__(self, name: str, color: (int, int, int), max_depth: int):
-        super().__init__(name, color)
+    def __init__(
+        self,
+        name: str,
+        color: (int, int, int),
+        max_depth: int,
+        table_size: int = 2 ** 16,
+        budget: Union[SearchBudget, Dict[Game.Phase, SearchBudget], None] = None,
+        workers: int = 1,
+        rng: Optional[random.Random] = None
+    ):
+        """
+        :param max_depth: The depth to search to when there is no budget for the phase.
+        :param table_size: The number of transposition table slots.
+        :param budget: A budget for every move, or a budget per game phase (phases missing from the dict
+                       use max_depth). None always searches to max_depth.
+        :param workers: The number of processes to split the root actions between. 1 searches in this process.
+        """
+        super().__init__(name, color, rng)
+        assert workers >= 1
+
         self.max_depth = max_depth
+        self.budget = budget
+        self.workers = workers
+        # Shared between branches (and moves) so positions reached by different build orders are only searched once.
+        self.transposition_table = TranspositionTable(table_size)
+
+        # Budget tracking for the current move.
+        self.nodes = 0
+        self.deadline: Optional[float] = None
+        self.node_limit: Optional[int] = None
+        self.completed_depth = 0
+
+        # Instrumentation for the current move (see search_stats).
+        self.stats = SearchStats()
+
+    def get_action(self, game: Game):
+        start = time.perf_counter()
+        table_hits, table_misses = self.transposition_table.hits, self.transposition_table.misses
+        self.transposition_table.new_search()
+        self.start_search()
+
+        budget = self.budget_for(game.phase)
+        actions = game.get_legal_actions(self) if self.workers > 1 else []
+        if len(actions) > 1:
+            action = self.parallel_search(game, actions, budget)
+        elif budget is None:
+            action, _ = self.search(game)
+            self.completed_depth = self.max_depth
+        else:
+            results = self.iterative_deepening(game, budget)
+            action, _ = results[self.completed_depth]
+
+        self.stats.moves = 1
+        self.stats.time = time.perf_counter() - start
+        self.stats.completed_depths = { self.completed_depth: 1 }
+        # Workers add their own table stats (see parallel_search).
+        self.stats.table_hits += self.transposition_table.hits - table_hits
+        self.stats.table_misses += self.transposition_table.misses - table_misses
+
+        return action or NoneAction()
+
+    def search_stats(self) -> Optional[SearchStats]:
+        return self.stats
+
+    def budget_for(self, phase: Game.Phase) -> Optional[SearchBudget]:
+        """
+        :param phase: The game phase.
+        :return: The budget for a move in this phase, or None to search to max_depth.
+        """
+        if isinstance(self.budget, dict):
+            return self.budget.get(phase)
+        return self.budget
+
+    def iterative_deepening(
+        self,
+        game: Game,
+        budget: SearchBudget,
+        actions: Optional[List[Action]] = None
+    ) -> Dict[int, Tuple[Optional[Action], float]]:
+        """
+        Searches deeper and deeper until the budget runs out.
+        :param game: The game state.
+        :param budget: The budget for this move.
+        :param actions: Only search these root actions (see search_actions), or None for all of them.
+        :return: The best action and its score for every depth that finished.
+        """
+        fixed_depth = self.max_depth
+        self.deadline = time.perf_counter() + budget.time_limit if budget.time_limit is not None else None
+        self.node_limit = budget.node_limit
+        results = {}
+
+        try:
+            for depth in range(1, budget.max_depth + 1):
+                self.max_depth = depth
+                try:
+                    results[depth] = self.search(game) if actions is None else self.search_actions(game, actions)
+                except SearchBudgetExceeded:
+                    break
+
+                self.completed_depth = depth
+                if self.budget_spent():
+                    break
+        finally:
+            self.max_depth = fixed_depth
+            self.deadline = None
+            self.node_limit = None
+
+        return results
+
+    def parallel_search(self, game: Game, actions: List[Action], budget: Optional[SearchBudget]) -> Optional[Action]:
+        """
+        Splits the root actions between the worker processes, and picks the best of what they find.
+        The game is sent to each worker once. Each worker keeps its own transposition table between moves.
+
+        :param game: The game state.
+        :param actions: The legal root actions.
+        :param budget: The budget for this move, or None to search to max_depth.
+        :return: The best action.
+        """
+        # The root is expanded here (the workers only get its actions), so count it here, like the serial search does.
+        self.count_node(0)
+        self.stats.children += len(actions)
+
+        # Every worker gets the whole time budget, the node budget is split between them.
+        shares = [actions[i::self.workers] for i in range(min(self.workers, len(actions)))]
+        if budget is not None and budget.node_limit is not None:
+            budget = replace(budget, node_limit=max(1, budget.node_limit // len(shares)))
+
+        data = dump_game(game)
+        pool = get_pool(self.workers)
+        # The workers search with copies of this agent, so each gets its own seed for the move (drawn here, so
+        # this agent's rng moves on and the next move rolls differently).
+        seed = self.rng.getrandbits(64)
+        futures = [
+            pool.submit(search_in_worker, data, self.id, share, budget, seed + index)
+            for index, share in enumerate(shares)
+        ]
+
+        worker_results = []
+        for future in futures:
+            results, nodes, stats = future.result()
+            worker_results.append(results)
+            self.nodes += nodes
+            self.stats.add_search(stats)
+
+        # Scores from different depths can't be compared, so use the deepest depth every worker finished.
+        self.completed_depth = min(max(results) for results in worker_results)
+        best_action, _ = max((results[self.completed_depth] for results in worker_results), key=lambda result: result[1])
+        return best_action
+
+    def search_root(
+        self,
+        game: Game,
+        actions: List[Action],
+        budget: Optional[SearchBudget]
+    ) -> Dict[int, Tuple[Optional[Action], float]]:
+        """
+        A worker's part of parallel_search: searches only some of the root actions.
+
+        :param game: The game state.
+        :param actions: The root actions to search.
+        :param budget: The budget, or None to search to max_depth.
+        :return: The best action and its score for every depth that finished.
+        """
+        table_hits, table_misses = self.transposition_table.hits, self.transposition_table.misses
+        self.transposition_table.new_search()
+        self.start_search()
+
+        if budget is None:
+            self.completed_depth = self.max_depth
+            results = { self.max_depth: self.search_actions(game, actions) }
+        else:
+            results = self.iterative_deepening(game, budget, actions)
+
+        self.stats.table_hits += self.transposition_table.hits - table_hits
+        self.stats.table_misses += self.transposition_table.misses - table_misses
+        return results
+
+    def budget_spent(self) -> bool:
+        """
+        :return: True if the move's time or node budget is used up.
+        """
+        return ((self.deadline is not None and time.perf_counter() >= self.deadline) or
+                (self.node_limit is not None and self.nodes >= self.node_limit))
+
+    def count_node(self, current_depth: int):
+        """
+        Counts an expanded node, and stops the search if the budget is spent
+        (never during the first depth, so there is always a result).
+        :param current_depth: The node's ply from the root.
+        """
+        self.nodes += 1
+        nodes_by_depth = self.stats.nodes_by_depth
+        nodes_by_depth[current_depth] = nodes_by_depth.get(current_depth, 0) + 1
+        if self.completed_depth and self.budget_spent():
+            raise SearchBudgetExceeded()
+
+    def start_search(self):
+        """
+        Resets per-move state before a search.
+        """
+        self.nodes = 0
+        self.completed_depth = 0
+        self.stats = SearchStats()
+
+    # -- Instrumented game calls --
+    # The search goes through these instead of calling the game directly, so they show up in search_stats.
+
+    def legal_actions(self, game: Game) -> List[Action]:
+        """
+        :return: The legal actions of the player to move.
+        """
+        start = time.perf_counter()
+        actions = game.get_legal_actions(game.current_player)
+        self.stats.legal_actions_time += time.perf_counter() - start
+        self.stats.children += len(actions)
+        return actions
+
+    def apply(self, game: Game, action: Action, roll: int) -> UndoRecord:
+        """
+        Game.apply.
+        """
+        start = time.perf_counter()
+        undo = game.apply(action, roll)
+        self.stats.successor_time += time.perf_counter() - start
+        self.stats.successors += 1
+        return undo
+
+    def undo(self, game: Game, undo: UndoRecord):
+        """
+        Game.undo.
+        """
+        start = time.perf_counter()
+        game.undo(undo)
+        self.stats.successor_time += time.perf_counter() - start
+
+    def search(self, game: Game):
+        """
+        Searches the game to max_depth.
+        :param game: The game state.
+        :return: The best action and its score.
+        """
+        raise NotImplementedError
+
+    def search_actions(self, game: Game, actions: List[Action]):
+        """
+        Same as search, but only tries some of the actions at the root (which is always this agent's turn).
+        :param game: The game state.
+        :param actions: The root actions to try.
+        :return: The best of them and its score.
+        """
+        return self.max_val(game, game.current_player, actions, 1)
 
     def evaluation_function(self, game: Game):
         """
@@ -28,215 +318,804 @@ class MultiAgent(Agent):
         :param game: The game state to check.
         :return: The score.
         """
-        player = next((player for player in game.players if player.id == self.id), None)
-        score = 0
+        start = time.perf_counter()
+        score = evaluate_features(self.evaluation_features(game))
+        self.stats.evaluation_time += time.perf_counter() - start
+        self.stats.evaluations += 1
+        return score
 
-        # Value adding new resources.
-        for resource, value in player.resource_connections_probability.items():
-            # Encourage getting all resources.
-            if value == 0:
-                score -= 10
+    def evaluation_features(self, game: Game) -> List[float]:
+        """
+        The feature vector evaluation_function scores (see evaluation.py): the probability of getting each resource,
+        cities, settlements and how good the road chains are.
+        :param game: The game state.
+        :return: The features.
+        """
+        player = game.players_by_id[self.id]
+        features = [player.resource_connections_probability[resource] for resource in RESOURCE_TYPES]
+        features.append(player.cities)
+        features.append(player.settlements)
+        # Reward consecutive roads towards valuable resources
+        features.append(self._evaluate_roads_towards_resources(player))
+        return features
+
+    def evaluate_actions(self, game: Game, actions: List[Action], roll: int = None) -> List[float]:
+        """
+        Evaluates the state after each action. The states are gathered first and scored in one batch.
+        :param game: The game state.
+        :param actions: The actions to take.
+        :param roll: The roll before each action, random if not given.
+        :return: The score after each action.
+        """
+        features = []
+        evaluation_time = 0
+        for action in actions:
+            undo = self.apply(game, action, roll or roll_dice(self.rng))
+            try:
+                start = time.perf_counter()
+                features.append(self.evaluation_features(game))
+                evaluation_time += time.perf_counter() - start
+            finally:
+                self.undo(game, undo)
+
+        start = time.perf_counter()
+        scores = evaluate_batch(features)
+        self.stats.evaluation_time += evaluation_time + time.perf_counter() - start
+        self.stats.evaluations += len(actions)
+        return scores
 
-            # Discourage desert.
-            if resource == Tile.Type.DESERT and value > 0:
-                score -= 100
+    def own_moves(self, game: Game, depth: int, offset: int = 0) -> int:
+        """
+        :param game: The game state.
+        :param depth: The number of moves.
+        :param offset: Start this many moves from now.
+        :return: How many of the moves are this agent's.
+        """
+        index = next(i for i, player in enumerate(game.players) if player.id == self.id)
+        start = game.current_player_index + offset
+        return sum(1 for k in range(depth) if (start + k) % len(game.players) == index)
 
-            # Limit to the min resource so it tries to get more of smallest resource.
-            score += min(min([value for value in player.resource_connections_probability.values()]) + 1, value) * 2
+    def evaluation_bounds(self, game: Game, depth: int) -> Tuple[float, float]:
+        """
+        Bounds on evaluation_function for every state reachable from this one in at most depth moves.
+        Only this agent's own builds change its evaluation (cards in hand and the other players don't count), and:
+        - Settlements/cities only add to it: 10 for the structure, at most 10 per resource it didn't have before
+          (3 tiles per intersection), and the resource term stays under 2 * the total probability (a tile adds at most 5/36).
+        - The road bonus is always between 0 and 0.75 * (value of every resource) per road.
 
-        # Add extra points for cities.
-        score += player.cities * 20
+        :param game: The game state.
+        :param depth: The number of moves left in the search.
+        :return: (lowest, highest) possible evaluation.
+        """
+        own_moves = self.own_moves(game, depth)
+        if own_moves == 0:
+            score = self.evaluation_function(game)
+            return score, score
 
-        # Extra (but less) points for settlements.
-        score += player.settlements * 10
+        player = game.players_by_id[self.id]
+        probabilities = player.resource_connections_probability
+        min_probability = min(probabilities.values())
 
-        # Reward consecutive roads towards valuable resources
-        consecutive_road_bonus = self._evaluate_roads_towards_resources(player) * 0.75
-        score += consecutive_road_bonus
+        zeros = sum(1 for value in probabilities.values() if value == 0)
+        coverable = sum(1 for resource, value in probabilities.items() if value == 0 and resource != Tile.Type.DESERT)
+        resource_score = sum(min(min_probability + 1, value) * 2 for value in probabilities.values())
+        structure_score = player.cities * 20 + player.settlements * 10
 
-        return score
+        lowest = -10 * zeros + resource_score + structure_score
+        highest = (-10 * (zeros - min(3 * own_moves, coverable)) +
+                   2 * (sum(probabilities.values()) + own_moves * 3 * (5 / 36)) +
+                   structure_score + 10 * own_moves +
+                   0.75 * sum(RESOURCE_VALUES.values()) * (len(player.roads) + own_moves))
+
+        # Slack for float rounding (the evaluation adds things up in a different order).
+        return lowest - 1e-9, max(highest, lowest) + 1e-9
 
     def _evaluate_roads_towards_resources(self, player: Player):
         """
         Evaluates how good a chain of roads is. This prevents the agent from building random roads to nowhere.
         It encourages building roads in a chain towards valuable resources.
+        The player's RoadNetwork keeps this up to date as roads are built.
 
         :param player: The player to check roads for.
         :return: The score of the roads.
         """
-        player_roads = player.roads
-        
-        # Use a DFS search to check where the roads are going.
-        visited_roads = set()
-        road_chains = []
-        
-        for road in player_roads:
-            if road in visited_roads:
-                continue
-                
-            visited_roads.add(road)
-            current_chain = [road]
-            self._expand_road_chain(current_chain, player_roads, visited_roads)
-
-            if len(current_chain) > 1:
-                road_chains.append(current_chain)
-
-        total_bonus = 0
-        for chain in road_chains:
-            length = len(chain)
-            resources_at_ends = set()
-
-            # Check start/end of chain.
-            for end_idx in [0, -1]:
-                road = chain[end_idx]
-
-                for intersection in [road.start, road.end]:
-                    for tile in intersection.adjacent_tiles:
-                        resources_at_ends.add(tile.type)
-
-            chain_resource_value = sum(RESOURCE_VALUES[res] for res in resources_at_ends)
-            chain_bonus = length * chain_resource_value
-            total_bonus += chain_bonus
-        
-        return total_bonus
-
-    def _expand_road_chain(self, current_chain, roads, visited_roads):
-        """
-        Uses DFS search to find all the connected roads in a chain.
-        :param current_chain: The chain to check.
-        :param roads: Possible roads (graph).
-        :param visited_roads: All roads already checked.
-        :return:
-        """
-        current_road = current_chain[-1]
-        endpoints = [current_road.start, current_road.end]
-        
-        for endpoint in endpoints:
-            for road in roads:
-                if road in visited_roads:
-                    continue
-                    
-                # Check if this road is connected to the current endpoint.
-                if road.start == endpoint or road.end == endpoint:
-                    visited_roads.add(road)
-                    current_chain.append(road)
-                    
-                    # Recursively expand from this new road.
-                    self._expand_road_chain(current_chain, roads, visited_roads)
+        return player.road_network.bonus
 
 # -- MINIMAX -- #
+# Move ordering, best first: cities are worth the most, roads the least.
+ACTION_PRIORITY = {
+    Structure.Type.CITY: 3,
+    Structure.Type.SETTLEMENT: 2,
+    Structure.Type.ROAD: 1,
+}
+
+def action_key(action: Action):
+    """
+    A hashable key for an action (Build is a dataclass, so it can't be a dict key itself).
+    :param action: The action.
+    :return: The key.
+    """
+    match action:
+        case Build(type=t, location=loc):
+            return t, loc
+    return None
+
 class MinimaxAgent(MultiAgent):
-    def __init__(self, name: str, color: (int, int, int)):
-        super().__init__(name, color, 2)
+    # Killer moves remembered per depth.
+    KILLERS_PER_DEPTH = 2
+
+    def __init__(self, name: str, color: (int, int, int), max_depth: int = 2, budget=None, workers: int = 1, rng=None):
+        super().__init__(name, color, max_depth, budget=budget, workers=workers, rng=rng)
+
+        # Move ordering heuristics, so alpha-beta cuts off as early as possible.
+        # Actions that caused a cutoff at each depth (killers) and how often each action caused one (history).
+        self.killers: List[List[Action]] = []
+        self.history: Dict[object, int] = {}
+
+    def minimax(self, game: Game, current_depth, alpha: float = float('-inf'), beta: float = float('inf')):
+        key = game.zobrist_hash()
+        depth = self.max_depth - current_depth
+        entry = self.transposition_table.lookup(key, depth)
+        if entry is not None:
+            if entry.flag == TranspositionTable.Flag.EXACT:
+                return entry.action, entry.score
+            if entry.flag == TranspositionTable.Flag.LOWER and entry.score >= beta:
+                return entry.action, entry.score
+            if entry.flag == TranspositionTable.Flag.UPPER and entry.score <= alpha:
+                return entry.action, entry.score
 
-    def minimax(self, game: Game, current_depth):
         if game.game_winner() or current_depth >= self.max_depth:
-            return None, self.evaluation_function(game)
+            score = self.evaluation_function(game)
+            self.transposition_table.store(key, depth, score, None)
+            return None, score
 
+        self.count_node(current_depth)
         next_depth = current_depth + 1
-        actions = game.get_legal_actions(game.current_player)
-        shuffle(actions)
+        actions = self.order_actions(game, self.legal_actions(game), key, current_depth)
 
         if game.current_player.id == self.id:
-            return self.max_val(game, game.current_player, actions, next_depth)
+            action, score = self.max_val(game, game.current_player, actions, next_depth, alpha, beta)
+        else:
+            action, score = self.min_val(game, game.current_player, actions, next_depth, alpha, beta)
+
+        if score <= alpha:
+            flag = TranspositionTable.Flag.UPPER
+        elif score >= beta:
+            flag = TranspositionTable.Flag.LOWER
         else:
-            return self.min_val(game, game.current_player, actions, next_depth)
+            flag = TranspositionTable.Flag.EXACT
 
-    def max_val(self, game, current_player, actions, next_depth):
+        self.transposition_table.store(key, depth, score, action, flag)
+        return action, score
+
+    def max_val(self, game, current_player, actions, next_depth, alpha=float('-inf'), beta=float('inf')):
         best_action = None
         best_score = float('-inf')
 
         for action in actions:
-            successor = game.generate_successor(current_player, action)
-            _, score = self.minimax(successor, next_depth)
+            undo = self.apply(game, action, roll_dice(self.rng))
+            try:
+                _, score = self.minimax(game, next_depth, alpha, beta)
+            finally:
+                self.undo(game, undo)
 
             if score > best_score:
                 best_score = score
                 best_action = action
 
+            if best_score >= beta:
+                self._record_cutoff(action, next_depth - 1)
+                break
+
+            alpha = max(alpha, best_score)
+
         return best_action, best_score
 
-    def min_val(self, game, current_player, actions, next_depth):
+    def min_val(self, game, current_player, actions, next_depth, alpha=float('-inf'), beta=float('inf')):
         best_action = None
         best_score = float('inf')
 
         for action in actions:
-            successor = game.generate_successor(current_player, action)
-            _, score = self.minimax(successor, next_depth)
+            undo = self.apply(game, action, roll_dice(self.rng))
+            try:
+                _, score = self.minimax(game, next_depth, alpha, beta)
+            finally:
+                self.undo(game, undo)
 
             if score < best_score:
                 best_score = score
                 best_action = action
 
+            if best_score <= alpha:
+                self._record_cutoff(action, next_depth - 1)
+                break
+
+            beta = min(beta, best_score)
+
         return best_action, best_score
 
-    def get_action(self, game: Game):
-        action, _ = self.minimax(game, 0)
-        return action or NoneAction()
+    def order_actions(self, game: Game, actions: List[Action], key: int, current_depth: int) -> List[Action]:
+        """
+        Orders actions so the ones most likely to be best are searched first:
+        the transposition table's best action, then killer moves, then cities, settlements and roads
+        (ties broken by the history heuristic, then randomly).
+
+        :param game: The current game state.
+        :param actions: The legal actions.
+        :param key: The zobrist hash of the game.
+        :param current_depth: The current depth.
+        :return: The ordered actions.
+        """
+        self.rng.shuffle(actions)
+
+        entry = self.transposition_table.probe(key)
+        tt_action = entry.action if entry is not None else None
+        killers = self.killers[current_depth] if current_depth < len(self.killers) else []
+
+        def priority(action):
+            if tt_action is not None and action == tt_action:
+                return 3, 0, 0
+            if action in killers:
+                return 2, 0, 0
+
+            history = self.history.get(action_key(action), 0)
+            match action:
+                case Build(type=t):
+                    return 1, ACTION_PRIORITY[t], history
+            return 0, 0, history
+
+        actions.sort(key=priority, reverse=True)
+        return actions
+
+    def _record_cutoff(self, action: Action, current_depth: int):
+        """
+        Remembers an action that caused a cutoff, for move ordering.
+        :param action: The action.
+        :param current_depth: The depth it was taken at.
+        """
+        self.stats.cutoffs += 1
+
+        remaining = self.max_depth - current_depth
+        key = action_key(action)
+        self.history[key] = self.history.get(key, 0) + remaining * remaining
+
+        while len(self.killers) <= current_depth:
+            self.killers.append([])
+
+        killers = self.killers[current_depth]
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[MinimaxAgent.KILLERS_PER_DEPTH:]
+
+    def start_search(self):
+        super().start_search()
+        # Killers only make sense for the current position, history is kept (but aged) between moves.
+        self.killers = []
+        self.history = { key: value // 2 for key, value in self.history.items() if value > 1 }
+
+    def search(self, game: Game):
+        return self.minimax(game, 0)
+
+    def search_actions(self, game: Game, actions: List[Action]):
+        actions = self.order_actions(game, list(actions), game.zobrist_hash(), 0)
+        return super().search_actions(game, actions)
 
 # -- EXPECTIMAX --#
 class ExpectimaxAgent(MultiAgent):
-    def __init__(self, name: str, color: (int, int, int)):
-        super().__init__(name, color, 1)
+    def __init__(self, name: str, color: (int, int, int), max_depth: int = 1, budget=None, workers: int = 1, rng=None):
+        super().__init__(name, color, max_depth, budget=budget, workers=workers, rng=rng)
 
-    def expectimax(self, game: Game, current_depth: int):
+    def expectimax(self, game: Game, current_depth: int, alpha: float = float('-inf'), beta: float = float('inf'),
+                   probe: bool = False):
         """
         Expectimax function to calculate the expected value of a game.
+        Uses alpha-beta at max/min nodes and Star1/Star2 pruning at chance nodes.
 
         :param game: The current game state.
         :param current_depth: The current depth.
+        :param alpha: The score max is already guaranteed.
+        :param beta: The score min is already guaranteed.
+        :param probe: Only search the first action (Star2 probe). The result is then a lower bound
+                      at max nodes and an upper bound at min nodes.
         :return: The EV.
         """
+        key = game.zobrist_hash()
+        depth = self.max_depth - current_depth
+        entry = self.transposition_table.lookup(key, depth)
+        if entry is not None:
+            if entry.flag == TranspositionTable.Flag.EXACT:
+                return entry.action, entry.score
+            if entry.flag == TranspositionTable.Flag.LOWER and entry.score >= beta:
+                return entry.action, entry.score
+            if entry.flag == TranspositionTable.Flag.UPPER and entry.score <= alpha:
+                return entry.action, entry.score
+
         if game.game_winner() or current_depth >= self.max_depth:
-            return None, self.evaluation_function(game)
+            score = self.evaluation_function(game)
+            self.transposition_table.store(key, depth, score, None)
+            return None, score
+
+        lowest, highest = self.evaluation_bounds(game, depth)
+        if lowest == highest and current_depth > 0:
+            # Nothing below here can change the evaluation.
+            self.stats.exact_bounds += 1
+            return None, lowest
 
+        self.count_node(current_depth)
         next_depth = current_depth + 1
-        actions = game.get_legal_actions(game.current_player)
-        shuffle(actions)
+        actions = self.legal_actions(game)
+        self.rng.shuffle(actions)
+
+        entry = self.transposition_table.probe(key)
+        if entry is not None and entry.action is not None and entry.action in actions:
+            actions.remove(entry.action)
+            actions.insert(0, entry.action)
+
+        if probe:
+            actions = actions[:1]
 
         if game.current_player.id == self.id:
-            return self.max_val(game, game.current_player, actions, next_depth)
+            action, score = self.max_val(game, game.current_player, actions, next_depth, alpha, beta)
         else:
-            return self.min_val(game, game.current_player, actions, next_depth)
+            action, score = self.min_val(game, game.current_player, actions, next_depth, alpha, beta)
+
+        if not probe:
+            if score <= alpha:
+                flag = TranspositionTable.Flag.UPPER
+            elif score >= beta:
+                flag = TranspositionTable.Flag.LOWER
+            else:
+                flag = TranspositionTable.Flag.EXACT
+            self.transposition_table.store(key, depth, score, action, flag)
+
+        return action, score
+
+    def max_val(self, game, current_player, actions, next_depth, alpha=float('-inf'), beta=float('inf')):
+        if actions and self.exact_after(game, next_depth):
+            scores = self.evaluate_exact(game, actions)
+            best_score = max(scores)
+            return actions[scores.index(best_score)], best_score
 
-    def max_val(self, game, current_player, actions, next_depth):
         best_action = None
         best_score = float('-inf')
 
-        for action in actions:
-            total = 0
-            for roll in range(1, 13):
-                prob = estimate_roll_probability(roll)
+        # Rolls with the same effect are only searched once.
+        outcomes = game.roll_outcomes()
 
-                successor = game.generate_successor(current_player, action, roll)
-                _, score = self.expectimax(successor, next_depth)
-                total += prob * score
+        for action in actions:
+            total = self.chance_value(game, action, outcomes, next_depth, max(alpha, best_score), beta)
 
             if total > best_score:
                 best_score = total
                 best_action = action
 
+            if best_score >= beta:
+                break
+
         return best_action, best_score
 
-    def min_val(self, game, current_player, actions, next_depth):
+    def min_val(self, game, current_player, actions, next_depth, alpha=float('-inf'), beta=float('inf')):
+        if actions and self.exact_after(game, next_depth):
+            scores = self.evaluate_exact(game, actions)
+            best_score = min(scores)
+            return actions[scores.index(best_score)], best_score
+
         best_action = None
         best_score = float('inf')
 
-        for action in actions:
-            total = 0
-            for roll in range(2, 13):
-                prob = estimate_roll_probability(roll)
+        # Rolls with the same effect are only searched once.
+        outcomes = game.roll_outcomes()
 
-                successor = game.generate_successor(current_player, action, roll)
-                _, score = self.expectimax(successor, next_depth)
-                total += prob * score
+        for action in actions:
+            total = self.chance_value(game, action, outcomes, next_depth, alpha, min(beta, best_score))
 
             if total < best_score:
                 best_score = total
                 best_action = action
 
+            if best_score <= alpha:
+                break
+
         return best_action, best_score
 
+    def exact_after(self, game: Game, next_depth: int) -> bool:
+        """
+        :return: True if this agent has no moves left after the current one, so the value of every action is
+                 the evaluation right after it, whatever the roll (see evaluation_bounds).
+        """
+        return self.own_moves(game, self.max_depth - next_depth, 1) == 0
+
+    def evaluate_exact(self, game: Game, actions: List[Action]) -> List[float]:
+        """
+        The value of every action when exact_after is true. Evaluates all of them in one batch.
+        Uses roll 7 (hands out nothing), since the evaluation doesn't look at cards.
+        """
+        self.stats.exact_bounds += len(actions)
+        return self.evaluate_actions(game, actions, 7)
+
+    def chance_value(self, game, action, outcomes, next_depth, alpha, beta):
+        """
+        The expected value of taking an action (over the rolls before it), with Star1/Star2 pruning.
+        Returns early with a bound once the value is known to be <= alpha or >= beta.
+
+        :param game: The current game state.
+        :param action: The action to take.
+        :param outcomes: The distinct roll outcomes (from Game.roll_outcomes).
+        :param next_depth: The depth of the nodes after the roll.
+        :param alpha: The score max is already guaranteed.
+        :param beta: The score min is already guaranteed.
+        :return: The expected value, or a bound on it that is outside (alpha, beta).
+        """
+        # The roll only changes cards, which the evaluation doesn't look at, so the bounds
+        # are the same after every roll. Use 7 (hands out nothing) to get them.
+        undo = self.apply(game, action, 7)
+        try:
+            lowest, highest = self.evaluation_bounds(game, self.max_depth - next_depth)
+        finally:
+            self.undo(game, undo)
+
+        if lowest == highest:
+            # Every outcome evaluates the same (e.g. the outcomes are leaves), no need to search them.
+            self.stats.exact_bounds += 1
+            return lowest
+
+        child_bounds = [(lowest, highest)] * len(outcomes)
+
+        # Star2: search one move after every roll. If the next player is max that gives lower bounds on
+        # every outcome (which can prove the value >= beta), if it's min it gives upper bounds (<= alpha).
+        next_is_max = game.next_player().id == self.id
+        if next_depth < self.max_depth and (beta < float('inf') if next_is_max else alpha > float('-inf')):
+            probed = 0
+            for i, (roll, prob) in enumerate(outcomes):
+                undo = self.apply(game, action, roll)
+                try:
+                    _, score = self.expectimax(game, next_depth, lowest, highest, probe=True)
+                finally:
+                    self.undo(game, undo)
+
+                probed += prob * score
+                child_bounds[i] = (score, highest) if next_is_max else (lowest, score)
+
+            if next_is_max and probed >= beta:
+                self.stats.star2_cutoffs += 1
+                return probed
+            if not next_is_max and probed <= alpha:
+                self.stats.star2_cutoffs += 1
+                return probed
+
+        # Star1: search the outcomes one by one, giving each a window that's only as wide as it needs to be,
+        # and stop as soon as the bounds on the outcomes left can't bring the value back into (alpha, beta).
+        total = 0
+        rest_lowest = sum(prob * child_lowest for (_, prob), (child_lowest, _) in zip(outcomes, child_bounds))
+        rest_highest = sum(prob * child_highest for (_, prob), (_, child_highest) in zip(outcomes, child_bounds))
+
+        if rest_highest <= alpha:
+            self.stats.star1_cutoffs += 1
+            return rest_highest
+        if rest_lowest >= beta:
+            self.stats.star1_cutoffs += 1
+            return rest_lowest
+
+        for (roll, prob), (child_lowest, child_highest) in zip(outcomes, child_bounds):
+            rest_lowest -= prob * child_lowest
+            rest_highest -= prob * child_highest
+
+            child_alpha = max((alpha - total - rest_highest) / prob, child_lowest)
+            child_beta = min((beta - total - rest_lowest) / prob, child_highest)
+
+            undo = self.apply(game, action, roll)
+            try:
+                _, score = self.expectimax(game, next_depth, child_alpha, child_beta)
+            finally:
+                self.undo(game, undo)
+            total += prob * score
+
+            if total + rest_highest <= alpha:
+                self.stats.star1_cutoffs += 1
+                return total + rest_highest
+            if total + rest_lowest >= beta:
+                self.stats.star1_cutoffs += 1
+                return total + rest_lowest
+
+        return total
+
+    def search(self, game: Game):
+        return self.expectimax(game, 0)
+
+class MCTSEdge:
+    """
+    An action taken from an MCTSNode, with the rewards seen through it.
+    The dice are rolled with every action (see Game.apply), so it leads to a different node for every distinct outcome.
+    """
+    __slots__ = ('action', 'player_id', 'visits', 'reward', 'outcomes')
+
+    def __init__(self, action: Action, player_id: str):
+        self.action = action
+        # The player taking the action. Rewards are from their point of view.
+        self.player_id = player_id
+        self.visits = 0
+        self.reward = 0.0
+        # The roll's effect (see Game.roll_effect) -> node. Rolls with the same effect lead to the same state, so they
+        # share a node (keying by the whole state would make a new node for almost every roll, since it includes hands).
+        self.outcomes: Dict[frozenset, MCTSNode] = {}
+
+class MCTSNode:
+    """
+    A state in the MCTS tree.
+    """
+    __slots__ = ('visits', 'untried', 'edges')
+
+    def __init__(self, actions: List[Action]):
+        self.visits = 0
+        # Actions that don't have an edge yet, expanded one per visit.
+        self.untried = actions
+        self.edges: List[MCTSEdge] = []
+
+class MCTSAgent(Agent):
+    def __init__(
+        self,
+        name: str,
+        color: (int, int, int),
+        iterations: Optional[int] = 200,
+        time_limit: Optional[float] = None,
+        exploration: float = math.sqrt(2),
+        playout_depth: int = 30,
+        production_weight: float = 3,
+        rng: Optional[random.Random] = None
+    ):
+        """
+        Monte Carlo Tree Search (UCT). Every iteration walks down the tree (sampling the dice like the real game),
+        adds one node, and plays random moves from there to score it.
+
+        :param iterations: Iterations per move, or None for no limit.
+        :param time_limit: Wall clock seconds per move, or None for no limit. At least one of the two must be set.
+        :param exploration: The UCT exploration constant. Higher tries more actions, lower focuses on the best ones.
+        :param playout_depth: Moves played in a playout before the state is scored.
+        :param production_weight: What production is worth in points when a playout doesn't finish (see strength).
+        """
+        super().__init__(name, color, rng)
+        assert iterations is not None or time_limit is not None, "MCTS needs an iteration or time budget"
+
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.production_weight = production_weight
+
+        # Stats for the last get_action (see search_stats).
+        self.stats = SearchStats()
+
     def get_action(self, game: Game):
-        action, _ = self.expectimax(game, 0)
-        return action or NoneAction()
\ No newline at end of file
+        start = time.perf_counter()
+        self.stats = SearchStats(moves=1)
+        action = self.choose_action(game)
+        self.stats.time = time.perf_counter() - start
+        return action
+
+    def search_stats(self) -> Optional[SearchStats]:
+        return self.stats
+
+    def choose_action(self, game: Game) -> Action:
+        """
+        Picks the move (get_action without the stats).
+        :param game: The game state.
+        :return: The action.
+        """
+        actions = game.get_legal_actions(self)
+        if len(actions) <= 1:
+            return actions[0] if actions else NoneAction()
+
+        self.rng.shuffle(actions)
+        if game.phase != Game.Phase.NORMAL:
+            return self.setup_action(game, actions)
+
+        root = MCTSNode(actions)
+        self.stats.tree_nodes = 1
+        deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+
+        # Always run one iteration, so there is an action to return.
+        while self.iterations is None or self.stats.iterations < self.iterations:
+            self.iterate(game, root)
+            self.stats.iterations += 1
+
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+        # Most visited is less noisy than highest average reward.
+        best = max(root.edges, key=lambda edge: edge.visits)
+        return best.action
+
+    def setup_action(self, game: Game, actions: List[Action]) -> Action:
+        """
+        Picks a setup placement. Game.apply doesn't move through the setup phases (the game manager does),
+        so there's nothing to play out yet. Takes the settlement with the best strength instead, and the road
+        towards the best spot for the next settlement (roads don't change strength).
+        :param game: The game state.
+        :param actions: The legal placements.
+        :return: The placement.
+        """
+        player = game.players_by_id[self.id]
+
+        def score(action: Action) -> float:
+            match action:
+                case Build(type=Structure.Type.ROAD, location=location):
+                    return self.road_value(game, player, game.board.edges[location])
+
+            undo = game.apply(action, 7)
+            try:
+                return self.strength(player)
+            finally:
+                game.undo(undo)
+
+        # Ties go to the first one (the actions are shuffled).
+        return max(actions, key=score)
+
+    def road_value(self, game: Game, player: Player, edge) -> float:
+        """
+        :param game: The game state.
+        :param player: The player building the road.
+        :param edge: Where the road would go.
+        :return: The best spot_value of a free settlement spot at either end of the road or one step past it.
+        """
+        board = game.board
+        spots = [spot for end in (edge.start, edge.end) for spot in [end] + end.adjacent_intersections]
+        return max((self.spot_value(player, spot) for spot in spots if board.can_build_structure(player, spot, True)),
+                   default=0)
+
+    def spot_value(self, player: Player, intersection) -> float:
+        """
+        :param player: The player.
+        :param intersection: A settlement spot.
+        :return: How much a settlement there would add to the production part of the player's strength.
+        """
+        probabilities = player.resource_connections_probability
+        gains = {}
+        for tile in intersection.adjacent_tiles:
+            if tile.type != Tile.Type.DESERT:
+                gains[tile.type] = gains.get(tile.type, 0) + estimate_roll_probability(tile.roll)
+
+        return self.production_weight * sum(math.sqrt(probabilities[resource] + gain) - math.sqrt(probabilities[resource])
+                                            for resource, gain in gains.items())
+
+    def iterate(self, game: Game, root: MCTSNode):
+        """
+        Runs one iteration (selection, expansion, playout, backpropagation) on the game in place.
+        The game is back to how it was when this returns.
+
+        :param game: The game state at the root.
+        :param root: The root of the tree.
+        """
+        node = root
+        path = [(root, None)]
+        undos = []
+
+        try:
+            # Selection and expansion.
+            while True:
+                if node.untried:
+                    edge = MCTSEdge(node.untried.pop(), game.current_player.id)
+                    node.edges.append(edge)
+                else:
+                    edge = self.select(node)
+
+                roll = roll_dice(self.rng)
+                key = game.roll_effect(roll)
+                undos.append(game.apply(edge.action, roll))
+                child = edge.outcomes.get(key)
+
+                if child is None:
+                    child = MCTSNode(self._expandable_actions(game))
+                    edge.outcomes[key] = child
+                    self.stats.tree_nodes += 1
+                    path.append((child, edge))
+                    break
+
+                node = child
+                path.append((node, edge))
+                if not node.untried and not node.edges:
+                    # The game is over.
+                    break
+
+            rewards = self.playout(game, undos)
+        finally:
+            for undo in reversed(undos):
+                game.undo(undo)
+
+        # Backpropagation.
+        for node, edge in path:
+            node.visits += 1
+            if edge is not None:
+                edge.visits += 1
+                edge.reward += rewards[edge.player_id]
+
+    def select(self, node: MCTSNode) -> MCTSEdge:
+        """
+        Picks the edge with the highest UCB1 score.
+        :param node: A node with every action expanded.
+        :return: The edge.
+        """
+        log_visits = math.log(node.visits)
+
+        def ucb(edge: MCTSEdge):
+            return edge.reward / edge.visits + self.exploration * math.sqrt(log_visits / edge.visits)
+
+        return max(node.edges, key=ucb)
+
+    def playout(self, game: Game, undos: List) -> Dict[str, float]:
+        """
+        Plays cheap moves (the best kind of build available, picked at random) until someone wins
+        or playout_depth moves are played, then scores the state.
+
+        :param game: The game to play on in place.
+        :param undos: Undo records for every move played are appended here.
+        :return: The reward (0 to 1) for every player id.
+        """
+        for _ in range(self.playout_depth):
+            if game.game_winner():
+                break
+
+            undos.append(game.apply(self._playout_action(game), roll_dice(self.rng)))
+
+        return self.rewards(game)
+
+    def _playout_action(self, game: Game) -> Action:
+        """
+        The playout policy: build the highest priority structure possible (city, then settlement, then road)
+        at a random spot, or do nothing if nothing can be built.
+        """
+        best_priority = 0
+        best = []
+        for action in game.get_legal_actions(game.current_player):
+            match action:
+                case Build(type=t):
+                    priority = ACTION_PRIORITY[t]
+                    if priority > best_priority:
+                        best_priority = priority
+                        best = [action]
+                    elif priority == best_priority:
+                        best.append(action)
+
+        return self.rng.choice(best) if best else NoneAction()
+
+    def rewards(self, game: Game) -> Dict[str, float]:
+        """
+        Scores the end of a playout. The winner gets 1 and everyone else 0. If nobody won, each player gets
+        0.5 plus how far ahead of the best other player they are (see strength), scaled to 0 to 1.
+
+        :param game: The game state.
+        :return: The reward for every player id.
+        """
+        winner = game.game_winner()
+        if winner is not None:
+            return { player.id: 1.0 if player.id == winner.id else 0.0 for player in game.players }
+
+        strengths = { player.id: self.strength(player) for player in game.players }
+
+        rewards = {}
+        for player_id, strength in strengths.items():
+            best_other = max(value for other_id, value in strengths.items() if other_id != player_id)
+            lead = (strength - best_other) / (2 * VICTORY_POINTS_TO_WIN)
+            rewards[player_id] = min(1.0, max(0.0, 0.5 + lead))
+
+        return rewards
+
+    def strength(self, player: Player) -> float:
+        """
+        How well a player is doing, in points. Production counts with diminishing returns per resource
+        (square root of the probability), since there's no trading and a missing resource blocks building.
+        """
+        production = sum(math.sqrt(probability) for resource, probability in player.resource_connections_probability.items()
+                         if resource != Tile.Type.DESERT)
+        return player.points + self.production_weight * production
+
+    def _expandable_actions(self, game: Game) -> List[Action]:
+        """
+        The actions to expand from a new node (none if the game is over).
+        """
+        if game.game_winner():
+            return []
+
+        actions = game.get_legal_actions(game.current_player)
+        self.rng.shuffle(actions)
+        return actions
+
@@ -0,0 +1,309 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent import Agent, MinimaxAgent, ExpectimaxAgent, MCTSAgent
+from board import Board
+from game import Game
+from gameRecord import GameRecord
+from headlessGameManager import HeadlessGameManager, PLAYERS, new_game
+from replay import ReplayGameManager
+
+# Where results are saved with --save and compared against by default.
+BASELINE_PATH = "benchmark_baseline.json"
+
+# A benchmark is slower than the baseline if its time went up by more than this (0.25 is 25%). Timings of the same
+# code easily move by 10-20% between runs, so anything less is mostly noise.
+REGRESSION_THRESHOLD = 0.25
+
+# Every benchmark is timed this many times, each for at least MIN_REPEAT_TIME seconds (calling it as often as needed).
+REPEATS = 5
+MIN_REPEAT_TIME = 0.2
+
+# Mid game positions are reached by playing at least this many turns from the seed.
+MID_GAME_TURNS = 30
+# Then up to this many more, until the player to move has a choice to make.
+MAX_EXTRA_TURNS = 200
+
+def managed_game(seed: int, agents: Optional[List[Callable[..., Agent]]] = None) -> Tuple[Game, HeadlessGameManager]:
+    """
+    Sets up the same game eval.py plays, from a seed (see headlessGameManager.new_game).
+    :param seed: The seed.
+    :param agents: Makes each player, or None for the usual ones.
+    :return: The game and its manager.
+    """
+    game = new_game(seed, agents)
+    return game, HeadlessGameManager(game)
+
+def mid_game(seed: int, agents: Optional[List[Callable[..., Agent]]] = None, mover: type = Agent) -> Game:
+    """
+    :param seed: The seed.
+    :param agents: Makes each player (see headlessGameManager.new_game), or None for the usual ones.
+    :param mover: The kind of agent that should be the one to move.
+    :return: The game after the agents played MID_GAME_TURNS turns, and then until a mover has more than one
+             legal action (so its move isn't trivial).
+    """
+    game, manager = managed_game(seed, agents)
+    for turn in range(MID_GAME_TURNS + MAX_EXTRA_TURNS):
+        if manager.winner:
+            break
+
+        player = game.current_player
+        if turn >= MID_GAME_TURNS and isinstance(player, mover) and len(game.get_legal_actions(player)) > 1:
+            break
+
+        manager.handle_agent(player.get_action(game))
+    return game
+
+# -- Benchmarks --
+# Each one sets up from a seed (not timed) and returns the function to time.
+
+def bench_create_board(seed: int) -> Callable:
+    rng = random.Random(seed)
+    return lambda: Board.create_default_board(rng)
+
+def bench_legal_actions_setup(seed: int) -> Callable:
+    game, _ = managed_game(seed)
+    return lambda: game.get_legal_actions(game.current_player)
+
+def bench_legal_actions(seed: int) -> Callable:
+    game = mid_game(seed)
+    return lambda: game.get_legal_actions(game.current_player)
+
+def bench_generate_successor(seed: int) -> Callable:
+    game = mid_game(seed)
+    player = game.current_player
+    actions = game.get_legal_actions(player)
+
+    def run():
+        for action in actions:
+            game.generate_successor(player, action, 8)
+    return run
+
+def bench_handle_roll(seed: int) -> Callable:
+    game = mid_game(seed)
+
+    def run():
+        for roll in range(2, 13):
+            # Hand the cards back (like Game.undo), so every call starts from the same hands.
+            for player, resource, count in game.handle_roll(roll):
+                player.add_cards(resource, -count)
+    return run
+
+def bench_evaluation_function(seed: int) -> Callable:
+    game = mid_game(seed)
+    agent = game.players[0]
+    return lambda: agent.evaluation_function(game)
+
+def _agent_move(game: Game, seed: int) -> Callable:
+    """
+    Times one move by the player to move. The agent starts every move the same way (empty table, no killer moves
+    or history, same rng), so every call does the same work.
+    """
+    agent = game.current_player
+
+    def run():
+        if hasattr(agent, "transposition_table"):
+            agent.transposition_table.clear()
+        if isinstance(agent, MinimaxAgent):
+            agent.killers = []
+            agent.history = {}
+        agent.rng = random.Random(seed)
+        return agent.get_action(game)
+    return run
+
+def bench_minimax_setup_move(seed: int) -> Callable:
+    game, manager = managed_game(seed)
+    # Let the other player place first if it goes first.
+    if not isinstance(game.current_player, MinimaxAgent):
+        manager.handle_agent(game.current_player.get_action(game))
+    return _agent_move(game, seed)
+
+def bench_minimax_move(seed: int) -> Callable:
+    return _agent_move(mid_game(seed, mover=MinimaxAgent), seed)
+
+def bench_expectimax_move(seed: int) -> Callable:
+    return _agent_move(mid_game(seed, mover=ExpectimaxAgent), seed)
+
+def bench_mcts_move(seed: int) -> Callable:
+    agents = [partial(MCTSAgent, *PLAYERS[0], iterations=100), partial(ExpectimaxAgent, *PLAYERS[1])]
+    return _agent_move(mid_game(seed, agents, MCTSAgent), seed)
+
+def bench_headless_game(seed: int) -> Callable:
+    def run():
+        _, manager = managed_game(seed)
+        return manager.run()
+    return run
+
+def bench_replay_game(seed: int) -> Callable:
+    _, manager = managed_game(seed)
+    manager.run()
+    record = GameRecord.decode(GameRecord.from_manager(manager, seed).encode())
+    return lambda: ReplayGameManager(record).run()
+
+BENCHMARKS: Dict[str, Callable[[int], Callable]] = {
+    "create_default_board": bench_create_board,
+    "get_legal_actions (setup)": bench_legal_actions_setup,
+    "get_legal_actions": bench_legal_actions,
+    "generate_successor (every action)": bench_generate_successor,
+    "handle_roll (every roll)": bench_handle_roll,
+    "evaluation_function": bench_evaluation_function,
+    "minimax move (setup)": bench_minimax_setup_move,
+    "minimax move": bench_minimax_move,
+    "expectimax move": bench_expectimax_move,
+    "mcts move": bench_mcts_move,
+    "headless game": bench_headless_game,
+    "replay game": bench_replay_game,
+}
+
+def time_benchmark(run: Callable) -> Dict[str, float]:
+    """
+    Times a benchmark: REPEATS rounds, each calling it enough times to take at least MIN_REPEAT_TIME.
+    :param run: The function to time.
+    :return: The fastest and median seconds per call, and the calls per round.
+    """
+    # Warm up (and find how many calls fill a round).
+    start = time.perf_counter()
+    run()
+    once = time.perf_counter() - start
+    number = max(1, int(MIN_REPEAT_TIME / once)) if once > 0 else 1000
+
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        times.append((time.perf_counter() - start) / number)
+
+    return { "min": min(times), "median": statistics.median(times), "number": number }
+
+def run_benchmarks(seed: int, only: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    :param seed: The seed every benchmark sets up from.
+    :param only: Only run benchmarks with this in their name.
+    :return: The timings (see time_benchmark) by benchmark name.
+    """
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+        results[name] = time_benchmark(setup(seed))
+        print(f"{name:<36} {format_time(results[name]['min'])}", file=sys.stderr)
+    return results
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+def machine() -> Dict[str, str]:
+    """
+    :return: What the timings depend on besides the code. Baselines from another machine aren't comparable.
+    """
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor()
+    }
+
+def compare(baseline: dict, results: Dict[str, Dict[str, float]], threshold: float) -> list:
+    """
+    Prints every benchmark next to its baseline.
+    :param baseline: A saved baseline (see save_baseline).
+    :param results: The new timings.
+    :param threshold: How much slower counts as a regression (0.25 is 25%).
+    :return: The names of the benchmarks that regressed.
+    """
+    if baseline.get("machine") != machine():
+        print("Warning: the baseline was recorded on a different machine or Python, timings may not be comparable.")
+
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name, timing in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<36} {'-':>11} {format_time(timing['min'])} {'new':>8}")
+            continue
+
+        # Compare the fastest rounds, they're the least affected by whatever else the machine is doing.
+        change = timing["min"] / old["min"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<36} {format_time(old['min'])} {format_time(timing['min'])} {change:+7.1%}{flag}")
+
+    return regressions
+
+def load_baseline(path: str) -> Optional[dict]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+def save_baseline(path: str, seed: int, results: Dict[str, Dict[str, float]]):
+    """
+    Saves the timings as the baseline. Benchmarks that weren't run keep their old baseline.
+    """
+    baseline = load_baseline(path) or { "results": {} }
+    baseline["seed"] = seed
+    baseline["machine"] = machine()
+    baseline["recorded"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    baseline["results"].update(results)
+
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+def main(seed: int = 0, baseline_path: str = BASELINE_PATH, save: bool = False,
+         threshold: float = REGRESSION_THRESHOLD, only: Optional[str] = None) -> bool:
+    """
+    Runs the benchmarks and compares them to the baseline (or saves them as the baseline).
+    :param seed: The seed every benchmark sets up from. Compare only runs with the same seed.
+    :param baseline_path: The baseline JSON file.
+    :param save: Save the timings as the new baseline instead of comparing.
+    :param threshold: How much slower counts as a regression.
+    :param only: Only run benchmarks with this in their name.
+    :return: Whether there were no regressions.
+    """
+    results = run_benchmarks(seed, only)
+
+    if save:
+        save_baseline(baseline_path, seed, results)
+        print(f"Saved baseline to {baseline_path}")
+        return True
+
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        print(f"No baseline at {baseline_path}, run with --save to record one.")
+        return True
+    if baseline.get("seed") != seed:
+        print(f"The baseline was recorded with seed {baseline.get('seed')}, not {seed}.")
+        return False
+
+    regressions = compare(baseline, results, threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+    return not regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the game and agents, and compares against a saved baseline.")
+    parser.add_argument("--save", action="store_true", help="Save the timings as the baseline.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="The baseline JSON file.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed the benchmarks set up from.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="How much slower counts as a regression (0.25 is 25%%).")
+    parser.add_argument("--only", default=None, help="Only run benchmarks with this in their name.")
+    args = parser.parse_args()
+
+    sys.exit(0 if main(args.seed, args.baseline, args.save, args.threshold, args.only) else 1)
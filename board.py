@@ -1,6 +1,7 @@
+import copy
 import math
-from random import shuffle
-from typing import Tuple, Dict, Optional, Union
+import random
+from typing import Tuple, Dict, Optional, List
 
 from constants import HEX_SIZE, DEFAULT_ROLL_RATIOS, DEFAULT_TILE_RATIO
 from player import Player
@@ -9,20 +10,272 @@ from tile import Tile
 from edge import Edge
 from intersection import Intersection
 from location import Location
-from util import hex_to_pixel, snap
-
-Coordinate = Tuple[int, int]
+from topology import Topology, Coordinate
+from util import hex_to_pixel, snap, iterate_bits
+from zobrist import zobrist_key
 
 class Board:
+    """
+    A board is its topology (tiles, intersections, edges and how they connect, which never change)
+    plus the roads and structures built on it. Copies share the topology.
+    """
     def __init__(
         self,
         grid: Dict[Coordinate, Tile],
         edges: Dict[Location, Edge] = None,
         intersections: Dict[Location, Intersection] = None
     ):
-        self.grid = grid
-        self.edges = edges if edges is not None else {}
-        self.intersections = intersections if intersections is not None else {}
+        self.topology = Topology(grid, edges if edges is not None else {}, intersections if intersections is not None else {})
+
+        # Shortcuts into the topology.
+        self.grid = self.topology.grid
+        self.edges = self.topology.edges
+        self.intersections = self.topology.intersections
+        self.intersection_list = self.topology.intersection_list
+        self.edge_list = self.topology.edge_list
+        self.intersection_neighbors = self.topology.intersection_neighbors
+        self.intersection_edges = self.topology.intersection_edges
+        self.edge_ends = self.topology.edge_ends
+        self.edge_neighbors = self.topology.edge_neighbors
+        self.all_intersections = self.topology.all_intersections
+
+        # Everything below changes as the game goes on, and is what copy() copies.
+        # What is built where, by edge/intersection index.
+        self.roads: List[Optional[Structure]] = [None] * len(self.edge_list)
+        self.structures: List[Optional[Structure]] = [None] * len(self.intersection_list)
+
+        # Bitboards. Who owns what is kept as one int mask per player (keyed by player id),
+        # so checks are a few bit ops.
+        self.road_masks: Dict[str, int] = {}
+        self.settlement_masks: Dict[str, int] = {}
+        self.city_masks: Dict[str, int] = {}
+        self.all_roads = 0
+        self.all_structures = 0
+        # Zobrist hash of every road and structure on the board, kept up to date as they change.
+        self.hash = 0
+
+        # Build frontiers, kept up to date as things are built so legal moves don't need a full board scan.
+        # Edges each player can build a road on, and intersections they can build a settlement on.
+        # (Cities can go on any of the player's settlements, so settlement_masks is that frontier.)
+        self.road_frontiers: Dict[str, int] = {}
+        self.settlement_frontiers: Dict[str, int] = {}
+        # Intersections that are taken or next to a structure (distance rule).
+        self.blocked = 0
+
+        # What each roll pays out: roll -> {(intersection index, tile): (owner id, resource, card count)}.
+        # Kept up to date as settlements/cities are built, so handing out resources is one lookup.
+        self.production: Dict[int, Dict[Tuple[int, Tile], Tuple[str, Tile.Type, int]]] = {
+            roll: {} for roll in DEFAULT_ROLL_RATIOS
+        }
+
+    def copy(self) -> 'Board':
+        """
+        Copies the board. The topology is shared, only the roads/structures and the masks kept for them are copied.
+
+        :return: The copy.
+        """
+        board = copy.copy(self)
+        board.roads = list(self.roads)
+        board.structures = list(self.structures)
+        board.road_masks = dict(self.road_masks)
+        board.settlement_masks = dict(self.settlement_masks)
+        board.city_masks = dict(self.city_masks)
+        board.road_frontiers = dict(self.road_frontiers)
+        board.settlement_frontiers = dict(self.settlement_frontiers)
+        board.production = {roll: dict(payouts) for roll, payouts in self.production.items()}
+        return board
+
+    def road_at(self, edge: Edge) -> Optional[Structure]:
+        """
+        :param edge: The edge to check.
+        :return: The road on the edge, or None.
+        """
+        return self.roads[edge.index]
+
+    def structure_at(self, intersection: Intersection) -> Optional[Structure]:
+        """
+        :param intersection: The intersection to check.
+        :return: The settlement/city on the intersection, or None.
+        """
+        return self.structures[intersection.index]
+
+    # -- Bitboards --
+    def structure_mask(self, player: Player) -> int:
+        """
+        Get all the intersections the player has a settlement or city on.
+
+        :param player: The player to check.
+        :return: A mask of intersection indexes.
+        """
+        return self.settlement_masks.get(player.id, 0) | self.city_masks.get(player.id, 0)
+
+    def build_road(self, player: Player, edge: Edge) -> Structure:
+        """
+        Build a road on an edge.
+
+        :param player: The player building the road.
+        :param edge: The edge to build on.
+        :return: The built road.
+        """
+        assert self.roads[edge.index] is None
+        road = Structure(Structure.Type.ROAD, player)
+        self.roads[edge.index] = road
+        self._set_road_bit(player, edge)
+        return road
+
+    def remove_road(self, edge: Edge, frontiers: tuple = None):
+        """
+        Removes a road (used to undo a build).
+
+        :param edge: The edge to clear.
+        :param frontiers: The frontier_state() from before the road was built. Rebuilt from scratch if not given.
+        """
+        owner_id = self.roads[edge.index].owner.id
+        bit = 1 << edge.index
+        self.road_masks[owner_id] &= ~bit
+        self.all_roads &= ~bit
+        self.hash ^= zobrist_key(Structure.Type.ROAD, edge.index, owner_id)
+        self.roads[edge.index] = None
+
+        self._restore_frontiers(frontiers)
+
+    def can_upgrade_to_city(self, player: Player, intersection: Intersection) -> bool:
+        """
+        Check if the player can upgrade a settlement to a city at this intersection.
+
+        :param player: The player who wants to upgrade.
+        :param intersection: The intersection to check.
+        :return: True if the player can upgrade to a city, False otherwise.
+        """
+        # Must be a settlement owned by the player.
+        return bool(self.settlement_masks.get(player.id, 0) & (1 << intersection.index))
+
+    def build_structure(self, structure_type: Structure.Type, player: Player, intersection: Intersection) -> Structure:
+        """
+        Build a settlement or city at an intersection.
+
+        :param structure_type: The type of structure to build.
+        :param player: The player building.
+        :param intersection: The intersection to build on.
+        :return: The built structure.
+        """
+        if structure_type == Structure.Type.SETTLEMENT:
+            assert self.structures[intersection.index] is None, "Cannot build settlement here"
+        elif structure_type == Structure.Type.CITY:
+            assert self.can_upgrade_to_city(player, intersection), "Cannot upgrade to city here"
+
+        assert structure_type != Structure.Type.ROAD, "Cannot build roads at intersections"
+
+        self._clear_structure_bit(intersection)
+        structure = Structure(structure_type, player)
+        self.structures[intersection.index] = structure
+        self._set_structure_bit(structure, intersection)
+        return structure
+
+    def restore_structure(self, intersection: Intersection, structure: Optional[Structure], frontiers: tuple = None):
+        """
+        Puts back what was on an intersection before a build (used to undo a build).
+
+        :param intersection: The intersection to restore.
+        :param structure: The structure that was there, or None.
+        :param frontiers: The frontier_state() from before the build. Rebuilt from scratch if not given.
+        """
+        self._clear_structure_bit(intersection)
+        self.structures[intersection.index] = structure
+        if structure is not None:
+            self._set_structure_bit(structure, intersection)
+
+        self._restore_frontiers(frontiers)
+    # -- Frontiers --
+    def frontier_state(self) -> tuple:
+        """
+        Saves the frontiers, so they can be put back when a build is undone
+        (they can't be updated backwards like the other masks).
+
+        :return: An opaque snapshot for remove_road/restore_structure.
+        """
+        return dict(self.road_frontiers), dict(self.settlement_frontiers), self.blocked
+
+    def open_intersections(self) -> int:
+        """
+        Get all the intersections a settlement could go on ignoring roads (initial placement rules).
+
+        :return: A mask of intersection indexes.
+        """
+        return self.all_intersections & ~self.blocked
+
+    def _restore_frontiers(self, frontiers: Optional[tuple]):
+        if frontiers is not None:
+            road_frontiers, settlement_frontiers, self.blocked = frontiers
+            self.road_frontiers = dict(road_frontiers)
+            self.settlement_frontiers = dict(settlement_frontiers)
+            return
+
+        self.blocked = 0
+        for index in iterate_bits(self.all_structures):
+            self.blocked |= (1 << index) | self.intersection_neighbors[index]
+
+        for player_id in set(self.road_masks) | set(self.settlement_masks) | set(self.city_masks):
+            road_frontier = 0
+            settlement_frontier = 0
+
+            for index in iterate_bits(self.road_masks.get(player_id, 0)):
+                road_frontier |= self.edge_neighbors[index]
+                settlement_frontier |= self.edge_ends[index]
+
+            structures = self.settlement_masks.get(player_id, 0) | self.city_masks.get(player_id, 0)
+            for index in iterate_bits(structures):
+                road_frontier |= self.intersection_edges[index]
+
+            self.road_frontiers[player_id] = road_frontier & ~self.all_roads
+            self.settlement_frontiers[player_id] = settlement_frontier & ~self.blocked
+
+    def _set_road_bit(self, player: Player, edge: Edge):
+        bit = 1 << edge.index
+        self.road_masks[player.id] = self.road_masks.get(player.id, 0) | bit
+        self.all_roads |= bit
+        self.hash ^= zobrist_key(Structure.Type.ROAD, edge.index, player.id)
+
+        # Nobody can build here anymore, and the owner can now build on from both ends.
+        for player_id in self.road_frontiers:
+            self.road_frontiers[player_id] &= ~bit
+        self.road_frontiers[player.id] = (self.road_frontiers.get(player.id, 0) | self.edge_neighbors[edge.index]) & ~self.all_roads
+        self.settlement_frontiers[player.id] = (self.settlement_frontiers.get(player.id, 0) | self.edge_ends[edge.index]) & ~self.blocked
+
+    def _set_structure_bit(self, structure: Structure, intersection: Intersection):
+        bit = 1 << intersection.index
+        masks = self.city_masks if structure.type == Structure.Type.CITY else self.settlement_masks
+        masks[structure.owner.id] = masks.get(structure.owner.id, 0) | bit
+        self.all_structures |= bit
+        self.hash ^= zobrist_key(structure.type, intersection.index, structure.owner.id)
+
+        # Blocks the intersection and its neighbours for everyone, and the owner can build roads out of it.
+        self.blocked |= bit | self.intersection_neighbors[intersection.index]
+        for player_id in self.settlement_frontiers:
+            self.settlement_frontiers[player_id] &= ~self.blocked
+        owner_id = structure.owner.id
+        self.road_frontiers[owner_id] = (self.road_frontiers.get(owner_id, 0) | self.intersection_edges[intersection.index]) & ~self.all_roads
+
+        # Settlement, 1 card. City, 2 cards.
+        count = 2 if structure.type == Structure.Type.CITY else 1
+        for tile in intersection.adjacent_tiles:
+            if tile.type != Tile.Type.DESERT:
+                self.production.setdefault(tile.roll, {})[(intersection.index, tile)] = (owner_id, tile.type, count)
+
+    def _clear_structure_bit(self, intersection: Intersection):
+        structure = self.structures[intersection.index]
+        if structure is None:
+            return
+
+        bit = 1 << intersection.index
+        masks = self.city_masks if structure.type == Structure.Type.CITY else self.settlement_masks
+        masks[structure.owner.id] &= ~bit
+        self.all_structures &= ~bit
+        self.hash ^= zobrist_key(structure.type, intersection.index, structure.owner.id)
+
+        for tile in intersection.adjacent_tiles:
+            if tile.type != Tile.Type.DESERT:
+                del self.production[tile.roll][(intersection.index, tile)]
     
     def get_structure_at_location(self, location: Location):
         """
@@ -33,10 +286,10 @@ class Board:
         """
         if location.is_intersection():
             if location in self.intersections:
-                return self.intersections[location].structure
+                return self.structure_at(self.intersections[location])
         elif location.is_edge():
             if location in self.edges:
-                return self.edges[location].road
+                return self.road_at(self.edges[location])
         return None
 
     def get_all_at_location(self, location: Location) -> [Structure]:
@@ -55,11 +308,7 @@ class Board:
             intersection = self.get_at_location(location)
             if intersection:
                 structures.append(intersection)
-
-            for edge_loc, edge in self.edges.items():
-                edge_start, edge_end = edge_loc.coords
-                if edge_start == location.coords or edge_end == location.coords:
-                    structures.append(edge)
+                structures += intersection.edges
                     
         elif location.is_edge():
             edge = self.get_at_location(location)
@@ -102,15 +351,13 @@ class Board:
         :param edge: The edge to check.
         :return: True if the player can build a road, False otherwise.
         """
-        if edge.road is not None:
+        bit = 1 << edge.index
+        if self.all_roads & bit:
             return False
 
-        all_connected = self.get_all_at_location(edge.location)
-        for item in all_connected:
-            if item.owner == player:
-                return True
-
-        return False
+        # Connected through one of the player's roads, or one of the player's structures.
+        return bool(self.road_masks.get(player.id, 0) & self.edge_neighbors[edge.index] or
+                    self.structure_mask(player) & self.edge_ends[edge.index])
 
     def can_build_structure(self, player: Player, intersection: Intersection, initial_placement_rules: bool = False) -> bool:
         """
@@ -125,34 +372,33 @@ class Board:
         :param initial_placement_rules: True if rules are different for initial placing rules.
         :return: True if a structure can be built, False otherwise.
         """
-        if intersection.structure is not None:
+        index = intersection.index
+        if self.all_structures & (1 << index):
             return False
 
         # Check if there are any structures at adjacent intersections.
-        for adj_intersection in intersection.adjacent_intersections:
-            if adj_intersection.structure is not None:
-                return False
+        if self.all_structures & self.intersection_neighbors[index]:
+            return False
 
         if initial_placement_rules:
             return True
 
         # Check that player has a road connecting directly to this intersection.
         if player and intersection.location:
-            for edge_loc, edge in self.edges.items():
-                edge_start, edge_end = edge_loc.coords
-                if (edge_start == intersection.location.coords or edge_end == intersection.location.coords) and edge.road and edge.road.owner == player:
-                    return True
-                    
-            return False
+            return bool(self.road_masks.get(player.id, 0) & self.intersection_edges[index])
 
         return True
 
     @staticmethod
-    def create_default_board():
+    def create_default_board(rng: Optional[random.Random] = None):
         """
         Creates the default Catan board.
+        :param rng: Where the tile layout comes from. Seed it to get the same board again, random if not given.
         :return: A type of Board with all the tiles, edges, and intersections.
         """
+        if rng is None:
+            rng = random.Random()
+
         # Create a list of all possible rolls and tiles.
         tile_types = []
         rolls = []
@@ -163,8 +409,8 @@ class Board:
         for roll in DEFAULT_ROLL_RATIOS.keys():
             rolls += [roll] * DEFAULT_ROLL_RATIOS[roll]
 
-        shuffle(tile_types)
-        shuffle(rolls)
+        rng.shuffle(tile_types)
+        rng.shuffle(rolls)
 
         # Combine the tiles and rolls.
         tiles = [Tile(Tile.Type.DESERT, 0)]
@@ -172,53 +418,120 @@ class Board:
         for tile_type, roll in zip(tile_types, rolls):
             tiles.append(Tile(tile_type, roll))
 
-        shuffle(tiles)
-
-        index = 0
-        grid = {}
-
-        for q in range(-2, 3):
-            for r in range(-2, 3):
-                s = -q - r
-                if -2 <= s <= 2:
-                    grid[(q, r)] = tiles[index]
-                    index += 1
+        rng.shuffle(tiles)
 
-        edges = {}
-        intersections = {}
+        return Board.from_layout([(tile.type, tile.roll) for tile in tiles])
 
-        # Build intersections.
-        for (q, r), tile in grid.items():
-            cx, cy = hex_to_pixel(q, r)
+    @staticmethod
+    def from_layout(layout: List[Tuple[Tile.Type, int]]) -> 'Board':
+        """
+        Makes a default shaped board with the given tiles. The shape is worked out once (see _default_shape),
+        so this only makes the objects.
+        :param layout: The type and roll of every tile, in the order of the grid (see layout).
+        :return: The board.
+        """
+        coordinates, intersection_shapes, edge_shapes = _default_shape()
+        assert len(layout) == len(coordinates)
 
-            corners_px = []
-            for i in range(6):
-                angle_deg = 60 * i - 30
-                angle_rad = math.radians(angle_deg)
-                corner_x = cx + HEX_SIZE * math.cos(angle_rad)
-                corner_y = cy + HEX_SIZE * math.sin(angle_rad)
-                location = Location.intersection(*snap(corner_x, corner_y))
-                corners_px.append(location)
+        tiles = [Tile(tile_type, roll) for tile_type, roll in layout]
+        grid = dict(zip(coordinates, tiles))
 
-                if location not in intersections:
-                    intersections[location] = Intersection([], location)
+        intersection_list = [Intersection([tiles[position] for position in positions], location)
+                             for location, positions, _, _ in intersection_shapes]
+        edge_list = [Edge(intersection_list[start], intersection_list[end], location)
+                     for location, start, end, _ in edge_shapes]
 
-                if tile not in intersections[location].adjacent_tiles:
-                    intersections[location].adjacent_tiles.append(tile)
-        
-            # Now connect intersections and create edges.
-            for i in range(6):
-                start = corners_px[i]
-                end = corners_px[(i + 1) % 6]
-                edge_loc = Location.edge(start.coords, end.coords)
-                
-                if edge_loc not in edges:
-                    start_intersection = intersections[start]
-                    end_intersection = intersections[end]
-                    edge_obj = Edge(start_intersection, end_intersection, edge_loc)
-                    edges[edge_loc] = edge_obj
+        for intersection, (_, _, neighbors, edges) in zip(intersection_list, intersection_shapes):
+            intersection.adjacent_intersections = [intersection_list[index] for index in neighbors]
+            intersection.edges = [edge_list[index] for index in edges]
+        for edge, (_, _, _, neighbors) in zip(edge_list, edge_shapes):
+            edge.adjacent_edges = [edge_list[index] for index in neighbors]
 
-                    start_intersection.add_intersection(end_intersection)
-                    end_intersection.add_intersection(start_intersection)
+        edges = { edge.location: edge for edge in edge_list }
+        intersections = { intersection.location: intersection for intersection in intersection_list }
+        return Board(grid, edges, intersections)
 
-        return Board(grid, edges, intersections)
\ No newline at end of file
+    def layout(self) -> List[Tuple[Tile.Type, int]]:
+        """
+        :return: The type and roll of every tile, in grid order (what from_layout takes).
+        """
+        return [(tile.type, tile.roll) for tile in self.grid.values()]
+
+# The shape of the default board, the same whatever the tiles are (see _default_shape).
+_shape = None
+
+def _default_shape():
+    """
+    Works out the default board's shape once: where every intersection and edge is and how they connect,
+    as indexes (into the grid for tiles, and into each other), in the order the board keeps them.
+    :return: The grid coordinates, (location, tile positions, neighbouring intersections, edges) for every intersection,
+             and (location, start, end, neighbouring edges) for every edge.
+    """
+    global _shape
+    if _shape is not None:
+        return _shape
+
+    coordinates = []
+    for q in range(-2, 3):
+        for r in range(-2, 3):
+            s = -q - r
+            if -2 <= s <= 2:
+                coordinates.append((q, r))
+
+    edges = {}
+    intersections = {}
+
+    # Build intersections. Their tiles are grid positions for now.
+    for position, (q, r) in enumerate(coordinates):
+        cx, cy = hex_to_pixel(q, r)
+
+        corners_px = []
+        for i in range(6):
+            angle_deg = 60 * i - 30
+            angle_rad = math.radians(angle_deg)
+            corner_x = cx + HEX_SIZE * math.cos(angle_rad)
+            corner_y = cy + HEX_SIZE * math.sin(angle_rad)
+            location = Location.intersection(*snap(corner_x, corner_y))
+            corners_px.append(location)
+
+            if location not in intersections:
+                intersections[location] = Intersection([], location)
+
+            if position not in intersections[location].adjacent_tiles:
+                intersections[location].adjacent_tiles.append(position)
+
+        # Now connect intersections and create edges.
+        for i in range(6):
+            start = corners_px[i]
+            end = corners_px[(i + 1) % 6]
+            edge_loc = Location.edge(start.coords, end.coords)
+
+            if edge_loc not in edges:
+                start_intersection = intersections[start]
+                end_intersection = intersections[end]
+                edge_obj = Edge(start_intersection, end_intersection, edge_loc)
+                edges[edge_loc] = edge_obj
+
+                start_intersection.add_intersection(end_intersection)
+                end_intersection.add_intersection(start_intersection)
+                start_intersection.add_edge(edge_obj)
+                end_intersection.add_edge(edge_obj)
+
+    intersection_index = { intersection: index for index, intersection in enumerate(intersections.values()) }
+    edge_index = { edge: index for index, edge in enumerate(edges.values()) }
+
+    intersection_shapes = [
+        (intersection.location, list(intersection.adjacent_tiles),
+         [intersection_index[other] for other in intersection.adjacent_intersections],
+         [edge_index[edge] for edge in intersection.edges])
+        for intersection in intersections.values()
+    ]
+    # Incidence tables, so adjacency queries only look at neighbours instead of every edge.
+    edge_shapes = [
+        (edge.location, intersection_index[edge.start], intersection_index[edge.end],
+         [edge_index[other] for other in edge.start.edges + edge.end.edges if other is not edge])
+        for edge in edges.values()
+    ]
+
+    _shape = coordinates, intersection_shapes, edge_shapes
+    return _shape
\ No newline at end of file
@@ -1,5 +1,7 @@
 from tile import Tile
 
 class Card:
+    __slots__ = ('type',)
+
     def __init__(self, type: Tile.Type):
         self.type = type
\ No newline at end of file
@@ -1,27 +1,23 @@
-from typing import Union
-from uuid import uuid4
+from typing import List
+from itertools import count
 
 from intersection import Intersection
-from player import Player
-from structure import Structure
+
+_ids = count()
 
 class Edge:
+    """
+    Where a road can go. Edges are part of the board topology and never change,
+    the road built on one is kept by the Board (see Board.road_at).
+    """
+    __slots__ = ('id', 'start', 'end', 'location', 'index', 'adjacent_edges')
+
     def __init__(self, start: Intersection, end: Intersection, location=None):
-        self.id = uuid4()
-        self.road: Union[Structure, None] = None
+        self.id = next(_ids)
         self.start = start
-        self.owner = None
         self.end = end
         self.location = location
-
-    def build(self, player: Player) -> Structure:
-        """
-        Build a road on this edge.
-        
-        :param player: The player building the road.
-        :return: The built road structure.
-        """
-        assert self.road is None
-        self.road = Structure(Structure.Type.ROAD, player)
-        self.owner = player
-        return self.road
\ No newline at end of file
+        # Bit index, set by the Topology.
+        self.index = None
+        # Edges sharing an end with this edge, set by the Board.
+        self.adjacent_edges: List['Edge'] = []
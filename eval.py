@@ -1,129 +1,395 @@
-from agent import MinimaxAgent, ExpectimaxAgent
-from board import Board
+import argparse
+import contextlib
+import json
+import multiprocessing
+import random
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple, Union
+
+from agent import Agent
+from events import EventSink, JsonlSink
 from game import Game
-from headlessGameManager import HeadlessGameManager
+from gameRecord import GameRecord, write_records
+from headlessGameManager import HeadlessGameManager, new_game
+from searchStats import SearchStats
+
+# How many times a game is retried after its worker process died (e.g. ran out of memory).
+# A game that raises an exception isn't retried, it would just fail the same way again (same seed).
+MAX_RETRIES = 2
+
+# In a worker: where to say which games have started (see run_games).
+_started_games: Optional[multiprocessing.SimpleQueue] = None
 
-def run_game():
+def run_game(
+    seed: Optional[int] = None,
+    events: Optional[EventSink] = None,
+    records_path: Optional[str] = None,
+    agents: Optional[List[Callable[..., Agent]]] = None
+):
     """
     Runs a headless game and returns the winner, turns taken, and game stats.
-    :return: Tuple of (winning player, turns, game)
+    :param seed: Seeds the game's randomness (board, turn order, dice, agents), so the game can be played again.
+                 Random if not given.
+    :param events: Where to send the game's events (see events.py). Quiet if not given.
+    :param records_path: The file to add the game's record to (see gameRecord.py), if any.
+    :param agents: Makes each player (see headlessGameManager.new_game). Minimax against Expectimax if not given.
+    :return: Tuple of (winning player, turns, game, search stats by player id)
     """
-    # If you change this, make sure to change print statements below.
-    player1 = MinimaxAgent("Player 1", (51, 93, 184))
-    player2 = ExpectimaxAgent("Player 2", (184, 51, 71))
-    board = Board.create_default_board()
-    game = Game(board, [player1, player2])
+    game = new_game(seed, agents)
 
-    headless = HeadlessGameManager(game)
+    headless = HeadlessGameManager(game, events)
     winner, turns = headless.run()
-    
-    return winner, turns, game
 
-def main(epochs: int = 100):
+    if records_path:
+        write_records(records_path, [GameRecord.from_manager(headless, seed)])
+
+    return winner, turns, game, headless.search_stats
+
+def summarize(winner, turns: int, game: Game, search_stats: Dict[str, SearchStats]) -> dict:
     """
-    Eval script I use to count how many times a different agent wins.
-    :return: A breakdown of the number of times the minimax vs expectimax agent wins.
+    The parts of a finished game main needs. Small, so workers can send it back instead of the whole game.
+    :return: The winner's id (or None), turns taken, each player's settlements, cities, roads and points,
+             and the search stats of the players that search.
     """
-    win_count = {}
-    turn_counts = {}
-    stats = {
-        "Player 1": {
-            "win": {
-                "settlements": [],
-                "cities": [],
-                "roads": [],
-                "points": []
-            },
-            "loss": {
-                "settlements": [],
-                "cities": [],
-                "roads": [],
-                "points": []
+    return {
+        "winner": winner.id if winner else None,
+        "turns": turns,
+        "players": {
+            player.id: {
+                "settlements": player.settlements,
+                "cities": player.cities,
+                "roads": len(player.roads),
+                "points": player.points
             }
+            for player in game.players
         },
-        "Player 2": {
-            "win": {
-                "settlements": [],
-                "cities": [],
-                "roads": [],
-                "points": []
-            },
-            "loss": {
-                "settlements": [],
-                "cities": [],
-                "roads": [],
-                "points": []
-            }
-        }
+        "search": { player_id: stats.to_dict() for player_id, stats in search_stats.items() }
     }
 
-    for epoch in range(epochs):
-        print(f"-- Epoch {epoch} --")
-        winner, turns, game = run_game()
+def _start_worker(started_games: multiprocessing.SimpleQueue):
+    global _started_games
+    _started_games = started_games
 
-        # Track stats based on whether the player won or lost.
-        for player in game.players:
-            result = "win" if winner and player.id == winner.id else "loss"
-            stats[player.id][result]["settlements"].append(player.settlements)
-            stats[player.id][result]["cities"].append(player.cities)
-            stats[player.id][result]["roads"].append(len(player.roads))
-            stats[player.id][result]["points"].append(player.points)
-
-        if not winner:
-            if "None" in win_count:
-                win_count["None"] += 1
-            else:
-                win_count["None"] = 1
+def play_game(epoch: int, seed: int, log_path: Optional[str] = None, records_path: Optional[str] = None) -> dict:
+    """
+    Runs a game (in a worker process, or here when there's only one worker).
+    :param epoch: The game's epoch.
+    :param seed: The game's seed.
+    :param log_path: The file to append the game's events to (tagged with the epoch and seed), or None for no log.
+    :param records_path: The file to add the game's record to, if any.
+    :return: The summary of the game.
+    """
+    if _started_games is not None:
+        _started_games.put(epoch)
+
+    with (JsonlSink(log_path, tags={ "epoch": epoch, "seed": seed }) if log_path else EventSink()) as events:
+        return summarize(*run_game(seed, events, records_path))
+
+def run_games(
+    seeds: Dict[int, int],
+    workers: int,
+    log_path: Optional[str] = None,
+    records_path: Optional[str] = None
+) -> Iterator[Tuple[int, Union[dict, str]]]:
+    """
+    Runs games on a pool of worker processes, as they finish (not in order).
+    If a worker dies, the pool is replaced and the unfinished games are run again. The games that were running
+    at the time are suspects: they're run again in a process of their own, so a game that keeps killing its
+    worker can't take other games down with it. A suspect that dies alone MAX_RETRIES times fails.
+
+    :param seeds: The seed of every game, by epoch.
+    :param workers: The number of worker processes.
+    :param log_path: The file to append the games' events to, if any (see play_game).
+    :param records_path: The file to add the games' records to, if any.
+    :return: (epoch, summary) for every game, or (epoch, error) for games that failed.
+    """
+    pending = dict(seeds)
+    retries = { epoch: 0 for epoch in seeds }
+
+    while pending:
+        suspects = [epoch for epoch in pending if retries[epoch] > 0]
+        if suspects:
+            games = [{ epoch: pending[epoch] } for epoch in suspects]
         else:
-            player_id = winner.id
-            if player_id in win_count:
-                win_count[player_id] += 1
-                turn_counts[player_id].append(turns)
+            games = [pending]
+
+        for batch in games:
+            died = []
+            for epoch, result in _run_pool(batch, workers if len(batch) > 1 else 1, died, log_path, records_path):
+                del pending[epoch]
+                yield epoch, result
+
+            for epoch in died:
+                retries[epoch] += 1
+                if retries[epoch] > MAX_RETRIES:
+                    del pending[epoch]
+                    yield epoch, "Worker process died"
+
+def _run_pool(
+    seeds: Dict[int, int],
+    workers: int,
+    died: list,
+    log_path: Optional[str],
+    records_path: Optional[str]
+) -> Iterator[Tuple[int, Union[dict, str]]]:
+    """
+    Runs games on one pool until they're done or the pool breaks.
+    :param seeds: The seed of every game, by epoch.
+    :param workers: The number of worker processes.
+    :param died: Filled with the games that were running when a worker died.
+    :param log_path: The file to append the games' events to, if any.
+    :param records_path: The file to add the games' records to, if any.
+    :return: (epoch, summary) or (epoch, error) for every game that finished.
+    """
+    started_games = multiprocessing.SimpleQueue()
+    started = set()
+    finished = set()
+    broken = False
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker, initargs=(started_games,)) as pool:
+        futures = { pool.submit(play_game, epoch, seed, log_path, records_path): epoch for epoch, seed in seeds.items() }
+
+        for future in as_completed(futures):
+            # Read as we go, so the queue never fills up.
+            while not started_games.empty():
+                started.add(started_games.get())
+
+            epoch = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                broken = True
+                continue
+            except Exception:
+                result = traceback.format_exc()
+
+            finished.add(epoch)
+            yield epoch, result
+
+    if broken:
+        # If nothing says it started, blame every unfinished game, so a game that keeps killing workers always ends.
+        unfinished = [epoch for epoch in seeds if epoch not in finished]
+        died.extend([epoch for epoch in unfinished if epoch in started] or unfinished)
+
+def _play_here(epoch: int, seed: int, log_path: Optional[str], records_path: Optional[str]) -> Union[dict, str]:
+    """
+    :return: The summary of the game, or the error if it failed.
+    """
+    try:
+        return play_game(epoch, seed, log_path, records_path)
+    except Exception:
+        return traceback.format_exc()
+
+class Tally:
+    """
+    Running totals of the finished games, added up as they finish (so nothing is kept per game).
+    """
+    STATS = ("settlements", "cities", "roads", "points")
+
+    def __init__(self):
+        self.games = 0
+        # Wins by winner id ("None" for games nobody won).
+        self.win_count: Dict[str, int] = {}
+        # Total turns of each player's wins.
+        self.turn_totals: Dict[str, int] = {}
+        # Player id -> "win"/"loss" -> number of games and the total of every stat.
+        self.outcomes: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.search_stats: Dict[str, SearchStats] = {}
+
+    def add(self, result: dict):
+        """
+        Adds a finished game.
+        :param result: The game's summary (see summarize).
+        """
+        self.games += 1
+        winner = result["winner"]
+
+        # Track stats based on whether the player won or lost.
+        for player_id, player_stats in result["players"].items():
+            outcome = "win" if winner and player_id == winner else "loss"
+            totals = self.outcomes.setdefault(player_id, {}).setdefault(outcome, dict.fromkeys(("games",) + Tally.STATS, 0))
+            totals["games"] += 1
+            for stat in Tally.STATS:
+                totals[stat] += player_stats[stat]
+
+        for player_id, player_search in result["search"].items():
+            self.search_stats.setdefault(player_id, SearchStats()).add(SearchStats.from_dict(player_search))
+
+        key = winner if winner else "None"
+        self.win_count[key] = self.win_count.get(key, 0) + 1
+        if winner:
+            self.turn_totals[winner] = self.turn_totals.get(winner, 0) + result["turns"]
+
+    def report(self):
+        """
+        Prints the statistics.
+        """
+        print("\n-- AGENT TYPE --")
+        # If players ever change, should update them here.
+        # Would be better to make this adapt but too lazy to program it.
+        print("Player 1:", "Minimax")
+        print("Player 2:", "Expectimax")
+
+        print("\n\n-- WIN COUNTS --")
+        print(dict(sorted(self.win_count.items())))
+
+        print("\n\n-- AVERAGE TURNS TO WIN --")
+        for player_id, turns in sorted(self.turn_totals.items()):
+            print(f"{player_id}: {turns / self.win_count[player_id]:.2f} turns")
+
+        print("\n\n-- AVERAGE STATS --")
+        for player_id in sorted(self.outcomes):
+            print(f"\n{player_id} Stats:")
+
+            for outcome, title, none in (("win", "When Winning", "No wins"), ("loss", "When Losing", "No losses")):
+                totals = self.outcomes[player_id].get(outcome)
+                if totals:
+                    games = totals["games"]
+                    print(f"  {title} ({games} games):")
+                    for stat in Tally.STATS:
+                        print(f"    {stat.capitalize()}: {totals[stat] / games:.2f}")
+                else:
+                    print(f"  {title}: {none}")
+
+        print("\n\n-- SEARCH STATS --")
+        for player_id, stats in sorted(self.search_stats.items()):
+            print(f"\n{player_id}:")
+            print("  " + stats.report().replace("\n", "\n  "))
+
+def load_results(path: str) -> Dict[int, dict]:
+    """
+    Reads a results file (see main). A line cut short (e.g. by a crash while writing it) is skipped.
+    :param path: The file.
+    :return: The record of every game in it by epoch (the last one, if a game is in it more than once).
+    """
+    records = {}
+    try:
+        with open(path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["epoch"]] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+def _open_for_append(path: str) -> TextIO:
+    """
+    Opens a JSON lines file to add to. If the last line was cut short, it's ended first so the next line
+    doesn't get glued to it.
+    """
+    file = open(path, "a+")
+    if file.tell() > 0:
+        file.seek(file.tell() - 1)
+        if file.read(1) != "\n":
+            file.write("\n")
+    return file
+
+def main(epochs: int = 100, workers: int = 1, seed: Optional[int] = None, search_stats_path: Optional[str] = None,
+         log_path: Optional[str] = None, results_path: Optional[str] = None, resume: bool = False,
+         records_path: Optional[str] = None):
+    """
+    Eval script I use to count how many times a different agent wins.
+    :param epochs: The number of games.
+    :param workers: The number of processes to run games on. 1 runs them here, one at a time.
+    :param seed: Game i is seeded with seed + i, so any game can be played again. Random if not given
+                 (or, when resuming, the seed of the run being resumed).
+    :param search_stats_path: Where to write every game's search stats (one JSON line per game), if anywhere.
+    :param log_path: Where to append every game's events (one JSON line per event), if anywhere.
+    :param results_path: Where to write every game's summary as soon as it finishes (one JSON line per game),
+                         if anywhere. The file is only ever added to.
+    :param resume: Continue the run in results_path: games already in it are counted without playing them again
+                   (games that failed are played again).
+    :param records_path: Where to add every game's record (see gameRecord.py, and replay.py to play them back), if anywhere.
+    :return: A breakdown of the number of times the minimax vs expectimax agent wins.
+    """
+    done = {}
+    if resume:
+        assert results_path, "Resuming needs the results file of the run"
+        records = load_results(results_path)
+        done = { epoch: record for epoch, record in records.items() if "error" not in record }
+
+        # Every record (failed games too) has the run's seed, so a run where every game failed resumes with it.
+        base_seeds = { record.get("run_seed", record["seed"] - epoch) for epoch, record in records.items() }
+        assert len(base_seeds) <= 1, f"{results_path} has games from more than one run"
+        if base_seeds:
+            run_seed = base_seeds.pop()
+            assert seed is None or seed == run_seed, f"{results_path} was run with seed {run_seed}, not {seed}"
+            seed = run_seed
+    elif results_path and load_results(results_path):
+        raise ValueError(f"{results_path} already has results, resume the run or use another file")
+
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    print(f"Seed: {seed}")
+
+    seeds = { epoch: seed + epoch for epoch in range(epochs) }
+    tally = Tally()
+    failures = {}
+
+    # Games finished before resuming are added in epoch order.
+    for epoch in sorted(done):
+        if epoch in seeds:
+            tally.add(done[epoch])
+    if done:
+        print(f"Resuming: {tally.games} games already done")
+    seeds = { epoch: game_seed for epoch, game_seed in seeds.items() if epoch not in done }
+
+    if workers == 1:
+        games = ((epoch, _play_here(epoch, game_seed, log_path, records_path)) for epoch, game_seed in seeds.items())
+    else:
+        games = run_games(seeds, workers, log_path, records_path)
+
+    with contextlib.ExitStack() as files:
+        results_file = files.enter_context(_open_for_append(results_path)) if results_path else None
+        search_stats_file = None
+        if search_stats_path:
+            search_stats_file = files.enter_context(open(search_stats_path, "a" if resume else "w"))
+
+        for epoch, result in games:
+            if isinstance(result, dict):
+                tally.add(result)
+                record = { "epoch": epoch, "seed": seeds[epoch], "run_seed": seed, **result }
+                print(f"-- Epoch {epoch} -- {result['winner']} won in {result['turns']} turns")
             else:
-                win_count[player_id] = 1
-                turn_counts[player_id] = [turns]
-
-        print("\n\n")
-
-    print("\n-- AGENT TYPE --")
-    # If players ever change, should update them here.
-    # Would be better to make this adapt but too lazy to program it.
-    print("Player 1:", "Minimax")
-    print("Player 2:", "Expectimax")
-
-    print("\n\n-- WIN COUNTS --")
-    print(win_count)
-
-    print("\n\n-- AVERAGE TURNS TO WIN --")
-    for player_id, turns in turn_counts.items():
-        avg_turns = sum(turns) / len(turns)
-        print(f"{player_id}: {avg_turns:.2f} turns")
-
-    print("\n\n-- AVERAGE STATS --")
-    for player_id in stats:
-        print(f"\n{player_id} Stats:")
-
-        win_stats = stats[player_id]["win"]
-        if win_stats["points"]:
-            win_count = len(win_stats["points"])
-            print(f"  When Winning ({win_count} games):")
-            print(f"    Settlements: {sum(win_stats['settlements'])/win_count:.2f}")
-            print(f"    Cities: {sum(win_stats['cities'])/win_count:.2f}")
-            print(f"    Roads: {sum(win_stats['roads'])/win_count:.2f}")
-            print(f"    Points: {sum(win_stats['points'])/win_count:.2f}")
-        else:
-            print("  When Winning: No wins")
-
-        loss_stats = stats[player_id]["loss"]
-        if loss_stats["points"]:
-            loss_count = len(loss_stats["points"])
-            print(f"  When Losing ({loss_count} games):")
-            print(f"    Settlements: {sum(loss_stats['settlements'])/loss_count:.2f}")
-            print(f"    Cities: {sum(loss_stats['cities'])/loss_count:.2f}")
-            print(f"    Roads: {sum(loss_stats['roads'])/loss_count:.2f}")
-            print(f"    Points: {sum(loss_stats['points'])/loss_count:.2f}")
-        else:
-            print("  When Losing: No losses")
+                failures[epoch] = result
+                record = { "epoch": epoch, "seed": seeds[epoch], "run_seed": seed, "error": result }
+                print(f"-- Epoch {epoch} -- failed")
+
+            # Written as soon as the game is done, so a crash later on doesn't lose it.
+            if results_file is not None:
+                results_file.write(json.dumps(record) + "\n")
+                results_file.flush()
+            if search_stats_file is not None and "search" in record:
+                search_stats_file.write(json.dumps({ "epoch": epoch, "seed": seeds[epoch], "players": result["search"] }) + "\n")
+                search_stats_file.flush()
+
+    tally.report()
+
+    if failures:
+        print(f"\n\n-- FAILED GAMES ({len(failures)}) --")
+        for epoch in sorted(failures):
+            print(f"Epoch {epoch} (seed {seeds[epoch]}):")
+            print(failures[epoch])
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Plays the agents against each other and prints statistics.")
+    parser.add_argument("--epochs", type=int, default=100, help="Number of games.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to run games on.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the first game (random if not given).")
+    parser.add_argument("--search-stats", default=None,
+                        help="Write every game's search stats to this file (one JSON line per game).")
+    parser.add_argument("--log", default=None, help="Append every game's events to this file (one JSON line per event).")
+    parser.add_argument("--results", default=None,
+                        help="Write every game's result to this file as soon as it finishes (one JSON line per game).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the run in the --results file, without playing the games it already has.")
+    parser.add_argument("--records", default=None,
+                        help="Add every game's record to this file, to play back later with replay.py.")
+    args = parser.parse_args()
+
+    main(args.epochs, args.workers, args.seed, args.search_stats, args.log, args.results, args.resume, args.records)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import json
+from typing import Dict, List, Optional, TextIO
+
+# How PrintSink shows each kind of event. Events without a message aren't printed.
+MESSAGES = {
+    "roll": "Dice roll: {roll}",
+    "initial settlement": "{player} built initial settlement",
+    "initial road": "{player} built initial road",
+    "build": "{player} built {structure}",
+    "game over": "GAME OVER! {winner} wins!",
+    "search stats": "\n-- {player} search --\n{report}",
+}
+
+class EventSink:
+    """
+    Where a GameManager sends what happens in a game (rolls, builds, the end of the game).
+    Every event is a kind (e.g. "roll") and some JSON friendly fields. This one drops them (quiet mode).
+    """
+    def emit(self, event: str, **fields):
+        """
+        :param event: The kind of event.
+        :param fields: What happened.
+        """
+        pass
+
+    def flush(self):
+        """
+        Writes out anything buffered.
+        """
+        pass
+
+    def close(self):
+        """
+        Flushes, and releases anything the sink holds on to (e.g. its file).
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PrintSink(EventSink):
+    """
+    Prints events as readable lines (see MESSAGES), like the headless game always used to.
+    """
+    def emit(self, event: str, **fields):
+        message = MESSAGES.get(event)
+        if message is not None:
+            print(message.format(**fields))
+
+class BufferedSink(EventSink):
+    """
+    Keeps every event in memory, as a dict with the kind under "event".
+    """
+    def __init__(self):
+        self.events: List[dict] = []
+
+    def emit(self, event: str, **fields):
+        self.events.append({ "event": event, **fields })
+
+class JsonlSink(EventSink):
+    """
+    Appends events to a file, one JSON object per line. Lines are buffered and written in batches, so a game
+    doesn't do a write per event. Each batch is one write to a file opened for appending, so several processes
+    can log to the same file without mixing up their lines.
+    """
+    def __init__(self, path: str, batch_size: int = 1000, tags: Optional[Dict] = None):
+        """
+        :param path: The file to append to.
+        :param batch_size: How many events to buffer before writing them.
+        :param tags: Fields added to every event (e.g. which game it's from).
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.tags = tags or {}
+        self.lines: List[str] = []
+        self.file: Optional[TextIO] = None
+
+    def emit(self, event: str, **fields):
+        self.lines.append(json.dumps({ "event": event, **self.tags, **fields }))
+        if len(self.lines) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+
+        if self.file is None:
+            self.file = open(self.path, "a")
+        self.file.write("\n".join(self.lines) + "\n")
+        self.file.flush()
+        self.lines = []
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -1,19 +1,37 @@
 import random
 import copy
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 
 from action import Action, NoneAction, Build
 from board import Board
 from player import Player
 from structure import Structure
-from card import Card
 from tile import Tile
 from location import Location
 from intersection import Intersection
+from edge import Edge
+from util import iterate_bits, estimate_roll_probability, roll_dice
+from zobrist import zobrist_key
 
 VICTORY_POINTS_TO_WIN = 10
 
+@dataclass
+class UndoRecord:
+    """
+    Everything Game.apply changed, so Game.undo can put it back.
+    """
+    player_index: int
+    # (player, resource, count) for every payout of the roll.
+    cards_gained: List[Tuple[Player, Tile.Type, int]] = field(default_factory=list)
+    # Set only if the action built something.
+    structure_type: Optional[Structure.Type] = None
+    element: Union[Edge, Intersection, None] = None
+    previous_structure: Optional[Structure] = None
+    player_changes: Optional[tuple] = None
+    frontiers: Optional[tuple] = None
+
 class Game:
     class Phase(Enum):
         # First round placements.
@@ -22,13 +40,23 @@ class Game:
         # Regular gameplay.
         NORMAL = "Normal"
 
-    def __init__(self, board: Board, players: List[Player]):
+    def __init__(self, board: Board, players: List[Player], rng: Optional[random.Random] = None,
+                 shuffle_players: bool = True):
+        """
+        :param board: The board.
+        :param players: The players, in random order.
+        :param rng: Where the player order and the dice come from. Seed it to replay a game, random if not given.
+        :param shuffle_players: False keeps the players in the order given (e.g. to replay a recorded game).
+        """
         assert len(players) > 1
 
         self.board = board
         self.players = players
+        self.rng = rng if rng is not None else random.Random()
 
-        random.shuffle(self.players)
+        if shuffle_players:
+            self.rng.shuffle(self.players)
+        self.players_by_id = { player.id: player for player in players }
 
         self.last_settlement_placed: Optional[Intersection] = None
         self.phase = Game.Phase.SETTLEMENT
@@ -38,61 +66,78 @@ class Game:
         self.first_round_settlements = { player.id: [] for player in players }
 
     # -- Roll Methods --
-    @staticmethod
-    def roll() -> int:
+    def roll(self) -> int:
         """
         Rolls the die
         :return: The roll.
         """
-        return random.randint(1, 6) + random.randint(1, 6)
+        return roll_dice(self.rng)
 
-    def handle_roll(self, roll: int):
+    def handle_roll(self, roll: int) -> List[Tuple[Player, Tile.Type, int]]:
         """
         Distributes cards to players.
         :param roll: The die number rolled.
-        :return: Nothing.
+        :return: The cards given out, as (player, resource, count).
         """
+        cards_gained = []
+
         if roll == 7:
             # In the real game this is the robber.
             # At least for now, not implementing to keep it simple.
             pass
         else:
-            # Keep track of resources gained to print a summary
-            resources_gained = {player.id: [] for player in self.players}
-            
-            for coord, tile in self.board.grid.items():
-                if tile.roll == roll and tile.type != Tile.Type.DESERT:
-                    for location, intersection in self.board.intersections.items():
-                        # Check if the tile is a part of this intersection.
-                        if tile in intersection.adjacent_tiles and intersection.structure is not None:
-                            # Give resources to the player who owns a structure on this intersection.
-                            # Settlement, 1 card.
-                            # City, 2 cards.
-                            player = intersection.structure.owner
-
-                            if intersection.structure.type == Structure.Type.SETTLEMENT:
-                                player.add_card(Card(tile.type))
-                                resources_gained[player.id].append(tile.type)
-
-                            elif intersection.structure.type == Structure.Type.CITY:
-                                player.add_card(Card(tile.type))
-                                player.add_card(Card(tile.type))
-                                resources_gained[player.id].append(tile.type)
-                                resources_gained[player.id].append(tile.type)
+            # The board keeps track of who gets what for every roll.
+            for player_id, resource, count in self.board.production.get(roll, {}).values():
+                player = self.players_by_id[player_id]
+                player.add_cards(resource, count)
+                cards_gained.append((player, resource, count))
+
+        return cards_gained
+
+    def roll_effect(self, roll: int) -> frozenset:
+        """
+        :param roll: A roll.
+        :return: What the roll would hand out right now, as ((player id, resource), count) pairs.
+                 Rolls with equal effects lead to the same state.
+        """
+        gains = {}
+        if roll != 7:
+            for player_id, resource, count in self.board.production.get(roll, {}).values():
+                gains[(player_id, resource)] = gains.get((player_id, resource), 0) + count
+        return frozenset(gains.items())
+
+    def roll_outcomes(self) -> List[Tuple[int, float]]:
+        """
+        Groups the possible rolls by what they would do to the game right now. Rolls that hand out exactly
+        the same cards (e.g. 7, and any number nobody is on) lead to the same state, so only one of them
+        needs to be searched.
+        :return: (a roll, total probability of every roll with the same effect) for each distinct outcome.
+        """
+        outcomes = {}
+
+        for roll in range(2, 13):
+            effect = self.roll_effect(roll)
+            if effect in outcomes:
+                outcomes[effect][1] += estimate_roll_probability(roll)
+            else:
+                outcomes[effect] = [roll, estimate_roll_probability(roll)]
+
+        return [(roll, probability) for roll, probability in outcomes.values()]
 
     # -- Building --
-    def build(self, structure_type: Structure.Type, location: Location) -> bool:
+    def build(self, structure_type: Structure.Type, location: Location, undo: UndoRecord = None) -> bool:
         """
         Enables a player to build a structure.
         :param structure_type: The type of structure to build.
         :param location: The location where to build.
+        :param undo: If given, records what was built so it can be reverted.
         :return: True if built, false if the structure cannot be built.
         """
         player = self.current_player
         require_resources = self.phase == Game.Phase.NORMAL
 
         # Check if player has the required resources.
-        if require_resources and not player.can_make_structure(Structure(structure_type, player)):
+        if require_resources and not player.can_make_structure_of_type(structure_type):
             return False
 
         game_element = self.board.get_at_location(location)
@@ -103,58 +148,89 @@ class Game:
             if location.is_edge():
                 edge = game_element
                 if self.board.can_build_road(player, edge):
-                    edge.build(player)
-                    player.made_structure(structure_type, require_resources, None, edge)
+                    if undo is not None:
+                        undo.frontiers = self.board.frontier_state()
+                    self.board.build_road(player, edge)
+                    changes = player.made_structure(structure_type, require_resources, None, edge)
+                    if undo is not None:
+                        undo.structure_type = structure_type
+                        undo.element = edge
+                        undo.player_changes = changes
                     return True
 
         elif structure_type == Structure.Type.SETTLEMENT:
             if location.is_intersection():
                 intersection = game_element
                 if self.board.can_build_structure(player, intersection, self.phase == Game.Phase.SETTLEMENT):
-                    intersection.build_structure(structure_type, player)
-                    player.made_structure(structure_type, require_resources, intersection)
+                    self._record_intersection(undo, intersection)
+                    self.board.build_structure(structure_type, player, intersection)
+                    changes = player.made_structure(structure_type, require_resources, intersection)
+                    if undo is not None:
+                        undo.structure_type = structure_type
+                        undo.player_changes = changes
                     return True
 
         elif structure_type == Structure.Type.CITY:
             if location.is_intersection():
                 intersection = game_element
-                if intersection.can_upgrade_to_city(player):
-                    intersection.build_structure(structure_type, player)
-                    player.made_structure(structure_type, require_resources, intersection)
+                if self.board.can_upgrade_to_city(player, intersection):
+                    self._record_intersection(undo, intersection)
+                    self.board.build_structure(structure_type, player, intersection)
+                    changes = player.made_structure(structure_type, require_resources, intersection)
+                    if undo is not None:
+                        undo.structure_type = structure_type
+                        undo.player_changes = changes
                     return True
         
         return False
 
-    # TODO: Add DP here.
+    def _record_intersection(self, undo: Optional[UndoRecord], intersection: Intersection):
+        """
+        Saves what is on an intersection before it gets built on.
+        """
+        if undo is not None:
+            undo.element = intersection
+            undo.previous_structure = self.board.structure_at(intersection)
+            undo.frontiers = self.board.frontier_state()
+
     def get_legal_actions(self, player: Player) -> List[Action]:
+        """
+        Gets every action the player can take. Reads the frontiers the board keeps up to date,
+        so the cost scales with the number of legal actions instead of the size of the board.
+
+        :param player: The player to get actions for.
+        :return: The legal actions.
+        """
         actions = []
+        board = self.board
 
         # Check all the roads a player can build.
         if (self.phase == Game.Phase.ROAD or
             (player.can_make_structure_of_type(Structure.Type.ROAD) and self.phase == Game.Phase.NORMAL)):
             if self.phase == Game.Phase.ROAD and self.last_settlement_placed is not None:
                 # In the initial placement phase, only suggest edges connected to the last settlement.
-                for edge_loc, edge in self.board.edges.items():
-                    if (edge.start == self.last_settlement_placed or 
-                        edge.end == self.last_settlement_placed) and edge.road is None:
-                        actions.append(Build(Structure.Type.ROAD, edge_loc))
+                free_edges = board.intersection_edges[self.last_settlement_placed.index] & ~board.all_roads
             else:
-                for edge_loc, edge in self.board.edges.items():
-                    if self.board.can_build_road(player, edge):
-                        actions.append(Build(Structure.Type.ROAD, edge_loc))
+                free_edges = board.road_frontiers.get(player.id, 0)
+
+            for index in iterate_bits(free_edges):
+                actions.append(Build(Structure.Type.ROAD, board.edge_list[index].location))
 
         # Check all the settlements the player can build.
-        if (self.phase == Game.Phase.SETTLEMENT or
-            (player.can_make_structure_of_type(Structure.Type.SETTLEMENT) and self.phase == Game.Phase.NORMAL)):
-            for location, intersection in self.board.intersections.items():
-                if self.board.can_build_structure(player, intersection, self.phase == Game.Phase.SETTLEMENT):
-                    actions.append(Build(Structure.Type.SETTLEMENT, location))
+        if self.phase == Game.Phase.SETTLEMENT:
+            open_intersections = board.open_intersections()
+        elif player.can_make_structure_of_type(Structure.Type.SETTLEMENT) and self.phase == Game.Phase.NORMAL:
+            open_intersections = board.settlement_frontiers.get(player.id, 0)
+        else:
+            open_intersections = 0
+
+        for index in iterate_bits(open_intersections):
+            actions.append(Build(Structure.Type.SETTLEMENT, board.intersection_list[index].location))
 
         # Check all the cities a player can build.
         if player.can_make_structure_of_type(Structure.Type.CITY) and self.phase == Game.Phase.NORMAL:
-            for location, intersection in self.board.intersections.items():
-                if intersection.can_upgrade_to_city(player):
-                    actions.append(Build(Structure.Type.CITY, location))
+            for index in iterate_bits(board.settlement_masks.get(player.id, 0)):
+                actions.append(Build(Structure.Type.CITY, board.intersection_list[index].location))
 
         if self.phase == Game.Phase.NORMAL:
             actions.append(NoneAction())
@@ -190,16 +266,93 @@ class Game:
         
         return None
 
+    # -- Hashing --
+    def zobrist_hash(self) -> int:
+        """
+        Hashes everything the search cares about: structures, roads, hands, whose turn it is and the phase.
+        The board and hands are hashed incrementally, so this is O(number of players).
+        :return: A 64 bit hash.
+        """
+        value = self.board.hash ^ zobrist_key("turn", self.current_player_index) ^ zobrist_key("phase", self.phase)
+
+        for player in self.players:
+            value ^= player.hand_hash
+
+        if self.phase == Game.Phase.ROAD and self.last_settlement_placed is not None:
+            value ^= zobrist_key("last settlement", self.last_settlement_placed.index)
+
+        return value
+
     # -- Generating Successors --
+    def clone(self) -> 'Game':
+        """
+        Copies the game. Only what can change (board structures, players, turn, phase) is copied,
+        the board topology is shared with the original.
+        :return: The copy.
+        """
+        game = copy.copy(self)
+        game.board = self.board.copy()
+        game.players = [player.copy() for player in self.players]
+        game.players_by_id = { player.id: player for player in game.players }
+        game.current_player = game.players[self.current_player_index]
+        game.first_round_settlements = {
+            player_id: list(settlements) for player_id, settlements in self.first_round_settlements.items()
+        }
+        return game
+
     def generate_successor(self, player: Player, action: Action, roll: int = None):
-        deep_copy = copy.deepcopy(self)
-        deep_copy.handle_roll(roll or Game.roll())
+        successor = self.clone()
+        successor.handle_roll(roll or successor.roll())
         match action:
             case Build(type=t, location=loc):
-                deep_copy.build(t, loc)
+                successor.build(t, loc)
             case NoneAction():
                 pass
 
-        deep_copy.end_turn()
+        successor.end_turn()
+
+        return successor
+
+    # -- Apply / Undo --
+    def apply(self, action: Action, roll: int = None) -> UndoRecord:
+        """
+        Same as generate_successor, but changes this game in place instead of copying it.
+        Every apply must be reverted with undo (in reverse order) to get back the original game.
+
+        :param action: The action the current player takes.
+        :param roll: The roll before the action, random if not given.
+        :return: The record to pass to undo.
+        """
+        undo = UndoRecord(self.current_player_index)
+        undo.cards_gained = self.handle_roll(roll or self.roll())
+        match action:
+            case Build(type=t, location=loc):
+                self.build(t, loc, undo)
+            case NoneAction():
+                pass
+
+        self.end_turn()
+
+        return undo
+
+    def undo(self, undo: UndoRecord):
+        """
+        Reverts an apply.
+        :param undo: The record returned by apply.
+        """
+        self.current_player_index = undo.player_index
+        self.current_player = self.players[undo.player_index]
+
+        if undo.structure_type is not None:
+            player = self.current_player
+            element = undo.element
+
+            if undo.structure_type == Structure.Type.ROAD:
+                self.board.remove_road(element, undo.frontiers)
+                player.undo_structure(undo.structure_type, undo.player_changes, None, element)
+            else:
+                self.board.restore_structure(element, undo.previous_structure, undo.frontiers)
+                player.undo_structure(undo.structure_type, undo.player_changes, element)
 
-        return deep_copy
\ No newline at end of file
+        for player, resource, count in undo.cards_gained:
+            player.add_cards(resource, -count)
\ No newline at end of file
@@ -1,12 +1,20 @@
+from typing import List
+
 from action import Build, NoneAction, Action
 from structure import Structure
 from game import Game
 from card import Card
 from constants import *
+from events import EventSink
 
 class GameManager:
-    def __init__(self, game: Game):
+    def __init__(self, game: Game, events: EventSink = None):
+        """
+        :param game: The game to run.
+        :param events: Where to send what happens in the game (see events.py). Dropped if not given.
+        """
         self.game = game
+        self.events = events if events is not None else EventSink()
         self.roll_result = None
         self.game_over = False
         self.winner = None
@@ -17,6 +25,10 @@ class GameManager:
         self.awaiting_settlement = True
         self.awaiting_road = False
 
+        # Every action handled and every roll, in order (what a GameRecord keeps, see gameRecord.py).
+        self.history: List[Action] = []
+        self.rolls: List[int] = []
+
     def end_turn(self):
         """
         Called whenever the user ends their turn.
@@ -28,12 +40,16 @@ class GameManager:
 
         self.game.turn_counter += 1
 
-    def roll_dice(self):
+    def roll_dice(self, roll_value: int = None):
         """
         Handles rolling the die, and distributing cards.
+        :param roll_value: The roll, rolled here if not given.
         """
-        roll_value = Game.roll()
+        if roll_value is None:
+            roll_value = self.game.roll()
+        self.rolls.append(roll_value)
         self.roll_result = roll_value
+        self.events.emit("roll", turn=self.game.turn_counter, player=self.game.current_player.id, roll=roll_value)
         self.game.handle_roll(roll_value)
 
     def place_initial_settlement(self, location):
@@ -43,14 +59,16 @@ class GameManager:
         """
         intersection = self.game.board.get_at_location(location)
 
-        if not intersection or intersection.structure is not None:
+        if not intersection or self.game.board.structure_at(intersection) is not None:
             return False
 
         for adj_intersection in intersection.adjacent_intersections:
-            if adj_intersection.structure is not None:
+            if self.game.board.structure_at(adj_intersection) is not None:
                 return False
 
         self.game.build(Structure.Type.SETTLEMENT, location)
+        self.events.emit("initial settlement", turn=self.game.turn_counter, player=self.game.current_player.id,
+                         location=location.coords)
 
         if self.game.turn_counter < 3:
             self.game.first_round_settlements[self.game.current_player.id].append(intersection)
@@ -68,7 +86,7 @@ class GameManager:
         """
         edge = self.game.board.get_at_location(location)
 
-        if not edge or edge.road is not None:
+        if not edge or self.game.board.road_at(edge) is not None:
             return False
 
         is_connected = False
@@ -80,6 +98,8 @@ class GameManager:
             return False
 
         self.game.build(Structure.Type.ROAD, location)
+        self.events.emit("initial road", turn=self.game.turn_counter, player=self.game.current_player.id,
+                         location=location.coords)
 
         if self.game.turn_counter > 2:
             self.distribute_initial_resources()
@@ -127,11 +147,15 @@ class GameManager:
         :param location: The location to build at.
         """
         structure = self.game.build(structure_type, location)
+        if structure:
+            self.events.emit("build", turn=self.game.turn_counter, player=self.game.current_player.id,
+                             structure=structure_type.value, location=location.coords)
 
         winner = self.game.game_winner()
         if winner and not self.game_over:
             self.game_over = True
             self.winner = winner
+            self.events.emit("game over", turn=self.game.turn_counter, winner=winner.id)
         
         return structure
 
@@ -140,6 +164,7 @@ class GameManager:
         Handles actions taken by the agent.
         :param action: The action the agent wants to take.
         """
+        self.history.append(action)
         match action:
             case Build(type=t, location=loc):
                 match self.game.phase:
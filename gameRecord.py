@@ -0,0 +1,170 @@
+import struct
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from action import Action, Build, NoneAction
+from board import Board
+from structure import Structure
+from tile import Tile, RESOURCE_TYPES, RESOURCE_INDEX
+
+# Bumped whenever the binary format changes.
+RECORD_VERSION = 1
+
+# Actions as small integers: 0 is doing nothing, then a road on every edge, a settlement on every intersection
+# and a city on every intersection (each by index). The default board has 72 edges and 54 intersections, so every
+# action fits in a byte.
+NONE_CODE = 0
+ROAD_CODES = 1
+
+def encode_action(board: Board, action: Action) -> int:
+    """
+    :param board: The board the action is on.
+    :param action: The action.
+    :return: The action's code.
+    """
+    match action:
+        case Build(type=Structure.Type.ROAD, location=location):
+            return ROAD_CODES + board.edges[location].index
+        case Build(type=Structure.Type.SETTLEMENT, location=location):
+            return ROAD_CODES + len(board.edge_list) + board.intersections[location].index
+        case Build(type=Structure.Type.CITY, location=location):
+            return ROAD_CODES + len(board.edge_list) + len(board.intersection_list) + board.intersections[location].index
+    return NONE_CODE
+
+def decode_action(board: Board, code: int) -> Action:
+    """
+    :param board: The board the action is on.
+    :param code: The action's code (from encode_action).
+    :return: The action.
+    """
+    if code == NONE_CODE:
+        return NoneAction()
+
+    index = code - ROAD_CODES
+    if index < len(board.edge_list):
+        return Build(Structure.Type.ROAD, board.edge_list[index].location)
+
+    index -= len(board.edge_list)
+    if index < len(board.intersection_list):
+        return Build(Structure.Type.SETTLEMENT, board.intersection_list[index].location)
+
+    index -= len(board.intersection_list)
+    return Build(Structure.Type.CITY, board.intersection_list[index].location)
+
+@dataclass
+class GameRecord:
+    """
+    Everything needed to play a finished game back without the agents (see replay.py):
+    the board layout, the players in turn order, every action (as codes, see encode_action) and every roll.
+    """
+    # The type and roll of every tile, in grid order (see Board.layout).
+    layout: List[Tuple[Tile.Type, int]]
+    # Player ids, in turn order.
+    players: List[str]
+    # One byte per action handled by the game manager, in order.
+    actions: bytes
+    # One byte per roll, in order.
+    rolls: bytes
+    # The seed the game was played with, if it's known.
+    seed: Optional[int] = None
+
+    @staticmethod
+    def from_manager(manager, seed: Optional[int] = None) -> 'GameRecord':
+        """
+        Records the game a GameManager played.
+        :param manager: The game manager (its history and rolls).
+        :param seed: The seed the game was played with, if it's known.
+        :return: The record.
+        """
+        board = manager.game.board
+        return GameRecord(
+            layout=board.layout(),
+            players=[player.id for player in manager.game.players],
+            actions=bytes(encode_action(board, action) for action in manager.history),
+            rolls=bytes(manager.rolls),
+            seed=seed
+        )
+
+    def encode(self) -> bytes:
+        """
+        The record in a compact binary form (a couple hundred bytes for a whole game).
+        :return: The bytes.
+        """
+        parts = [struct.pack("<BB", RECORD_VERSION, len(self.layout))]
+        parts += [struct.pack("<BB", RESOURCE_INDEX[tile_type], roll) for tile_type, roll in self.layout]
+
+        parts.append(struct.pack("<B", len(self.players)))
+        for player_id in self.players:
+            name = player_id.encode()
+            parts.append(struct.pack("<B", len(name)) + name)
+
+        seed = b"" if self.seed is None else str(self.seed).encode()
+        parts.append(struct.pack("<B", len(seed)) + seed)
+
+        parts.append(struct.pack("<H", len(self.actions)) + self.actions)
+        parts.append(struct.pack("<H", len(self.rolls)) + self.rolls)
+        return b"".join(parts)
+
+    @staticmethod
+    def decode(data: bytes) -> 'GameRecord':
+        """
+        :param data: The result of encode.
+        :return: The record.
+        """
+        version, tiles = struct.unpack_from("<BB", data, 0)
+        assert version == RECORD_VERSION, f"Can't read version {version} game records"
+        offset = 2
+
+        layout = []
+        for _ in range(tiles):
+            type_index, roll = struct.unpack_from("<BB", data, offset)
+            layout.append((RESOURCE_TYPES[type_index], roll))
+            offset += 2
+
+        players = []
+        for _ in range(data[offset]):
+            length = data[offset + 1]
+            players.append(data[offset + 2:offset + 2 + length].decode())
+            offset += 1 + length
+        offset += 1
+
+        length = data[offset]
+        seed = int(data[offset + 1:offset + 1 + length]) if length else None
+        offset += 1 + length
+
+        (length,) = struct.unpack_from("<H", data, offset)
+        actions = data[offset + 2:offset + 2 + length]
+        offset += 2 + length
+
+        (length,) = struct.unpack_from("<H", data, offset)
+        rolls = data[offset + 2:offset + 2 + length]
+
+        return GameRecord(layout, players, actions, rolls, seed)
+
+def write_records(path: str, records: List[GameRecord]):
+    """
+    Adds records to a file (each one prefixed with its length). They're written in a single write to a file opened
+    for appending, so several processes can add to the same file.
+    :param path: The file.
+    :param records: The records.
+    """
+    data = b"".join(struct.pack("<I", len(encoded)) + encoded for encoded in (record.encode() for record in records))
+    with open(path, "ab") as file:
+        file.write(data)
+
+def read_records(path: str) -> Iterator[GameRecord]:
+    """
+    Reads every record in a file written by write_records. A record cut short at the end of the file is skipped.
+    :param path: The file.
+    :return: The records, in the order they were written.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+
+    offset = 0
+    while offset + 4 <= len(data):
+        (length,) = struct.unpack_from("<I", data, offset)
+        if offset + 4 + length > len(data):
+            break
+        yield GameRecord.decode(data[offset + 4:offset + 4 + length])
+        offset += 4 + length
@@ -136,14 +136,13 @@ class GUIGameManager(GameManager):
         self.selected_action = None
         self.message = f"{self.game.current_player.id}'s turn"
     
-    def roll_dice(self):
+    def roll_dice(self, roll_value: int = None):
         """
-        Handles rolling the die, and distributing cards.
+        Handles rolling the die, and distributing cards. Shows the roll on screen.
+        :param roll_value: The roll, rolled here if not given.
         """
-        roll_value = Game.roll()
-        self.roll_result = roll_value
-        self.message = f"Rolled: {roll_value}"
-        self.game.handle_roll(roll_value)
+        super().roll_dice(roll_value)
+        self.message = f"Rolled: {self.roll_result}"
     
     def pixel_to_hex(self, x, y):
         """
@@ -225,8 +224,9 @@ class GUIGameManager(GameManager):
                 # Determine color and width based on whether there's a road.
                 color = GRAY
                 width = 2
-                if edge.road is not None:
-                    color = edge.road.owner.color
+                road = self.game.board.road_at(edge)
+                if road is not None:
+                    color = road.owner.color
                     width = EDGE_WIDTH
 
                 if self.highlighted_element == edge.location:
@@ -244,10 +244,11 @@ class GUIGameManager(GameManager):
             color = GRAY
             size = INTERSECTION_SIZE
             
-            if intersection.structure is not None:
-                color = intersection.structure.owner.color
+            structure = self.game.board.structure_at(intersection)
+            if structure is not None:
+                color = structure.owner.color
 
-                if intersection.structure.type == Structure.Type.CITY:
+                if structure.type == Structure.Type.CITY:
                     size = INTERSECTION_SIZE * 1.5
 
             if self.highlighted_element == loc:
@@ -376,12 +377,12 @@ class GUIGameManager(GameManager):
         """
         intersection = self.game.board.get_at_location(location)
         
-        if not intersection or intersection.structure is not None:
+        if not intersection or self.game.board.structure_at(intersection) is not None:
             self.message = "Invalid location: Already occupied"
             return False
 
         for adj_intersection in intersection.adjacent_intersections:
-            if adj_intersection.structure is not None:
+            if self.game.board.structure_at(adj_intersection) is not None:
                 self.message = "Too close to another settlement"
                 return False
 
@@ -396,7 +397,7 @@ class GUIGameManager(GameManager):
         """
         edge = self.game.board.get_at_location(location)
 
-        if not edge or edge.road is not None:
+        if not edge or self.game.board.road_at(edge) is not None:
             self.message = "Invalid location: Already occupied"
             return False
 
@@ -1,54 +1,28 @@
-import sys
+import argparse
+import json
+import random
+from functools import partial
+from typing import Callable, Dict, List, Optional
 from agent import Agent, MinimaxAgent, ExpectimaxAgent
 from game import Game
 from board import Board
 from gameManager import GameManager
+from events import EventSink, PrintSink, JsonlSink
+from gameRecord import GameRecord, write_records
+from searchStats import SearchStats
+from util import derive_rng
 
 class HeadlessGameManager(GameManager):
-    def __init__(self, game: Game):
-        super().__init__(game)
-
-    def roll_dice(self):
-        """
-        Handles rolling the die, and distributing cards.
-        """
-        roll_value = Game.roll()
-        self.roll_result = roll_value
-        print(f"Dice roll: {roll_value}")
-        self.game.handle_roll(roll_value)
-
-    def place_initial_settlement(self, location):
+    def __init__(self, game: Game, events: EventSink = None):
         """
-        Handles initial settlement placement.
+        :param game: The game to run.
+        :param events: Where to send what happens in the game (see events.py). Quiet if not given.
         """
-        player = self.game.current_player
-        if super().place_initial_settlement(location):
-            print(f"{player.id} built initial settlement")
-            return True
-        return False
+        super().__init__(game, events)
 
-    def place_initial_road(self, location):
-        """
-        Handles initial road placement.
-        """
-        player = self.game.current_player
-        if super().place_initial_road(location):
-            print(f"{player.id} built initial road")
-            return True
-        return False
-
-    def build(self, structure_type, location):
-        """
-        Handles building a structure during the main game.
-        """
-        structure = super().build(structure_type, location)
-        if structure:
-            print(f"{self.game.current_player.id} built {structure_type}")
-
-        if self.winner and self.game_over:
-            print(f"GAME OVER! {self.winner.id} wins!")
-            
-        return structure
+        # Search stats of every move, and added up per player (only for agents that search, see Agent.search_stats).
+        self.move_stats: List[dict] = []
+        self.search_stats: Dict[str, SearchStats] = {}
 
     def run(self):
         """
@@ -67,6 +41,7 @@ class HeadlessGameManager(GameManager):
             if hasattr(self.game.current_player, 'get_action'):
                 agent: Agent = self.game.current_player
                 action = agent.get_action(self.game)
+                self.record_search_stats(agent, turn_count)
                 self.handle_agent(action)
                 turn_count += 1
             else:
@@ -74,21 +49,94 @@ class HeadlessGameManager(GameManager):
         
         # If we hit the turn limit without a winner.
         if turn_count >= max_turns and not self.winner:
+            self.events.emit("game end", winner=None, turns=max_turns)
+            self.events.flush()
             return None, max_turns
-            
+
+        self.events.emit("game end", winner=self.winner.id, turns=turn_count)
+        self.events.flush()
         return self.winner, turn_count
 
-def start_headless_game():
+    def record_search_stats(self, agent: Agent, turn: int):
+        """
+        Keeps the stats of the move the agent just picked.
+        :param agent: The agent.
+        :param turn: The turn number.
+        """
+        stats = agent.search_stats()
+        if stats is None:
+            return
+
+        self.move_stats.append({ "turn": turn, "player": agent.id, **stats.to_dict() })
+        self.search_stats.setdefault(agent.id, SearchStats()).add(stats)
+
+    def dump_search_stats(self, path: str):
+        """
+        Writes the search stats of the game (every move, and the totals per player) to a JSON file.
+        :param path: The file to write.
+        """
+        with open(path, "w") as file:
+            json.dump({
+                "players": { player_id: stats.to_dict() for player_id, stats in self.search_stats.items() },
+                "moves": self.move_stats
+            }, file, indent=2)
+
+# The players of the usual game (Minimax against Expectimax): name and color, in seat order.
+PLAYERS = [("Player 1", (51, 93, 184)), ("Player 2", (184, 51, 71))]
+
+def new_game(seed: Optional[int] = None, agents: Optional[List[Callable[..., Agent]]] = None) -> Game:
     """
-    Creates players, board, and starts a headless game.
+    Sets up a game from a seed. Everything that plays games (the headless game, eval, tournaments, benchmarks) sets
+    them up here, so the same seed always gives the same game.
+    :param seed: Seeds the agents, the board, turn order and dice (each from its own stream). Random if not given.
+    :param agents: Makes each player, called with rng=its random number generator.
+                   Minimax (Player 1) against Expectimax (Player 2) if not given.
+    :return: The game.
     """
-    player1 = MinimaxAgent("Player 1", (51, 93, 184))
-    player2 = ExpectimaxAgent("Player 2", (184, 51, 71))
-    board = Board.create_default_board()
-    game = Game(board, [player1, player2])
+    if agents is None:
+        agents = [partial(MinimaxAgent, *PLAYERS[0]), partial(ExpectimaxAgent, *PLAYERS[1])]
+
+    rng = random.Random(seed)
+    players = [make_agent(rng=derive_rng(rng)) for make_agent in agents]
+    board = Board.create_default_board(derive_rng(rng))
+    return Game(board, players, derive_rng(rng))
 
-    headless = HeadlessGameManager(game)
+def start_headless_game(seed: int = None, stats_path: str = None, events: EventSink = None, record_path: str = None):
+    """
+    Creates players, board, and starts a headless game.
+    :param seed: Seeds everything random in the game, so it can be played again. Random if not given.
+    :param stats_path: Where to write the search stats of the game (see dump_search_stats), if anywhere.
+    :param events: Where to send the game's events. Printed if not given.
+    :param record_path: The file to add the game's record to (see gameRecord.py), if any.
+    """
+    headless = HeadlessGameManager(new_game(seed), events if events is not None else PrintSink())
     headless.run()
 
+    for player_id, stats in headless.search_stats.items():
+        headless.events.emit("search stats", player=player_id, report=stats.report(), stats=stats.to_dict())
+    headless.events.flush()
+
+    if stats_path:
+        headless.dump_search_stats(stats_path)
+
+    if record_path:
+        write_records(record_path, [GameRecord.from_manager(headless, seed)])
+
 if __name__ == "__main__":
-    start_headless_game()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Plays one game between the agents.")
+    parser.add_argument("seed", type=int, nargs="?", default=None, help="Seed of the game (random if not given).")
+    parser.add_argument("--search-stats", default=None, help="Write every move's search stats to this JSON file.")
+    parser.add_argument("--log", default=None, help="Append the game's events to this file (one JSON line each) instead of printing them.")
+    parser.add_argument("--quiet", action="store_true", help="Don't print the game's events.")
+    parser.add_argument("--record", default=None, help="Add the game's record to this file (to play back with replay.py).")
+    args = parser.parse_args()
+
+    if args.log:
+        sink = JsonlSink(args.log)
+    elif args.quiet:
+        sink = EventSink()
+    else:
+        sink = PrintSink()
+
+    with sink:
+        start_headless_game(args.seed, args.search_stats, sink, args.record)
\ No newline at end of file
@@ -1,18 +1,26 @@
-from uuid import uuid4
+from itertools import count
 from typing import List
 
-from player import Player
-from structure import Structure
 from tile import Tile
 
+_ids = count()
+
 class Intersection:
+    """
+    Where a settlement or city can go. Intersections are part of the board topology and never change,
+    the structure built on one is kept by the Board (see Board.structure_at).
+    """
+    __slots__ = ('id', 'adjacent_intersections', 'edges', 'adjacent_tiles', 'location', 'index')
+
     def __init__(self, tiles: List[Tile], location=None):
-        self.id = uuid4()
-        self.structure = None
-        self.owner = None
+        self.id = next(_ids)
         self.adjacent_intersections: List['Intersection'] = []
+        # Edges with this intersection as one of their ends.
+        self.edges = []
         self.adjacent_tiles = tiles
         self.location = location
+        # Bit index, set by the Topology.
+        self.index = None
 
     def add_intersection(self, intersection: 'Intersection'):
         """
@@ -23,33 +31,11 @@ class Intersection:
         if intersection not in self.adjacent_intersections:
             self.adjacent_intersections.append(intersection)
 
-    def can_upgrade_to_city(self, player: Player) -> bool:
-        """
-        Check if the player can upgrade a settlement to a city at this intersection.
-        
-        :param player: The player who wants to upgrade.
-        :return: True if the player can upgrade to a city, False otherwise.
+    def add_edge(self, edge):
         """
-        # Must be a settlement owned by the player.
-        return (self.structure is not None and 
-                self.structure.owner == player and 
-                self.structure.type == Structure.Type.SETTLEMENT)
+        Add an edge that touches this intersection.
 
-    def build_structure(self, structure_type: Structure.Type, player: Player) -> Structure:
+        :param edge: The edge to add.
         """
-        Build a structure at this intersection.
-        
-        :param structure_type: The type of structure to build.
-        :param player: The player building the structure.
-        :return: The built structure.
-        """
-        if structure_type == Structure.Type.SETTLEMENT:
-            assert self.structure is None, "Cannot build settlement here"
-        elif structure_type == Structure.Type.CITY:
-            assert self.can_upgrade_to_city(player), "Cannot upgrade to city here"
-        
-        assert structure_type != Structure.Type.ROAD, "Cannot build roads at intersections"
-        
-        self.structure = Structure(structure_type, player)
-        self.owner = player
-        return self.structure
\ No newline at end of file
+        if edge not in self.edges:
+            self.edges.append(edge)
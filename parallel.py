@@ -0,0 +1,93 @@
+import io
+import pickle
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Optional
+
+from action import Action
+from game import Game
+from searchStats import SearchStats
+from transposition import TranspositionTable
+
+# Worker pools by number of workers. Shared by every agent and kept between moves, since starting processes is slow.
+_pools: Dict[int, ProcessPoolExecutor] = {}
+
+# In a worker: the tables standing in for the main process's transposition tables (by table id), kept between moves.
+# Only the most recently used ones are kept, so finished games don't pile up.
+_tables: 'OrderedDict[int, TranspositionTable]' = OrderedDict()
+MAX_WORKER_TABLES = 8
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    :param workers: The number of worker processes.
+    :return: The pool with that many workers (started the first time it's asked for).
+    """
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        _pools[workers] = pool
+    return pool
+
+class _GamePickler(pickle.Pickler):
+    """
+    Pickles a game without the agents' transposition tables. They're big, and each worker keeps its own.
+    """
+    def persistent_id(self, obj):
+        if isinstance(obj, TranspositionTable):
+            return obj.id, obj.size
+        return None
+
+class _GameUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        table_id, size = pid
+        table = _tables.get(table_id)
+        if table is None:
+            table = TranspositionTable(size)
+            _tables[table_id] = table
+            if len(_tables) > MAX_WORKER_TABLES:
+                _tables.popitem(last=False)
+        else:
+            _tables.move_to_end(table_id)
+        return table
+
+def dump_game(game: Game) -> bytes:
+    """
+    Serializes a game to send to the workers.
+    :param game: The game.
+    :return: The pickled game.
+    """
+    data = io.BytesIO()
+    _GamePickler(data, pickle.HIGHEST_PROTOCOL).dump(game)
+    return data.getvalue()
+
+def load_game(data: bytes) -> Game:
+    """
+    Deserializes a game in a worker. The agents get this worker's copy of their transposition tables.
+    :param data: The result of dump_game.
+    :return: The game.
+    """
+    return _GameUnpickler(io.BytesIO(data)).load()
+
+def search_in_worker(
+    data: bytes,
+    agent_id: str,
+    actions: List[Action],
+    budget,
+    seed: int
+) -> Tuple[Dict[int, Tuple[Optional[Action], float]], int, SearchStats]:
+    """
+    Runs in a worker: searches some of the root actions (see MultiAgent.parallel_search).
+
+    :param data: The game from dump_game.
+    :param agent_id: The id of the agent to search with.
+    :param actions: The root actions to search.
+    :param budget: The SearchBudget for this worker, or None to search to max_depth.
+    :param seed: Seeds the agent's randomness for this search (the pickled copy of its rng is the same every move).
+    :return: (best action, score) for every depth that finished, the number of nodes expanded, and the search stats.
+    """
+    game = load_game(data)
+    agent = game.players_by_id[agent_id]
+    agent.rng = random.Random(seed)
+    results = agent.search_root(game, actions, budget)
+    return results, agent.nodes, agent.stats
@@ -1,13 +1,21 @@
+import copy
+
 from card import Card
+from roadNetwork import RoadNetwork
 from structure import Structure
-from tile import Tile
+from tile import Tile, RESOURCE_TYPES, RESOURCE_INDEX
 from util import estimate_roll_probability
+from zobrist import zobrist_key, HAND_HASH_MASK
 
 
 class Player:
     def __init__(self, name: str, color: (int, int, int)):
         self.id = name
-        self.cards: [Card] = []
+        # Number of cards of each resource, indexed by RESOURCE_INDEX.
+        self.hand = [0] * len(RESOURCE_TYPES)
+        # Zobrist hash of the cards in hand (see zobrist.py).
+        self.hand_hash = 0
+        self._card_keys = [zobrist_key(name, resource) for resource in RESOURCE_TYPES]
         self.points = 0
         self.color = color
 
@@ -18,13 +26,32 @@ class Player:
         self.cities = 0
         self.settlements = 0
         self.roads = []
+        # The roads as connected chains (shared with copies, see RoadNetwork).
+        self.road_network = RoadNetwork()
+
+    @property
+    def cards(self) -> [Card]:
+        """
+        The users deck as Card objects. Made from the hand counts on every call, so prefer hand in hot code.
+        """
+        return [Card(resource) for resource, count in zip(RESOURCE_TYPES, self.hand) for _ in range(count)]
 
     def add_card(self, card: Card):
         """
         Adds a card to the users deck.
         :param card: The card to add.
         """
-        self.cards.append(card)
+        self.add_cards(card.type, 1)
+
+    def add_cards(self, card_type: Tile.Type, count: int):
+        """
+        Adds multiple cards of one type to the users deck.
+        :param card_type: The card type to add.
+        :param count: How many to add (negative removes).
+        """
+        index = RESOURCE_INDEX[card_type]
+        self.hand[index] += count
+        self.hand_hash = (self.hand_hash + count * self._card_keys[index]) & HAND_HASH_MASK
 
     def use_card_of_type(self, card_type):
         """
@@ -32,10 +59,9 @@ class Player:
         :param card_type: The card type to use.
         :return: True if the card exists and was removed, false otherwise.
         """
-        for card in self.cards:
-            if card.type == card_type:
-                self.cards.remove(card)
-                return True
+        if self.hand[RESOURCE_INDEX[card_type]] > 0:
+            self.add_cards(card_type, -1)
+            return True
 
         return False
 
@@ -53,18 +79,9 @@ class Player:
         :param structure_type: The type of the structure to make.
         :return: True if the user has the cards to make a structure, false otherwise.
         """
-        required = structure_type.required_cards()
-        card_count = {}
-
-        for card in self.cards:
-            if card.type in required:
-                if card.type in card_count:
-                    card_count[card.type] += 1
-                else:
-                    card_count[card.type] = 1
-
-        for resource_type, count in required.items():
-            if resource_type not in card_count or card_count[resource_type] < count:
+        hand = self.hand
+        for index, count in structure_type.cost():
+            if hand[index] < count:
                 return False
 
         return True
@@ -76,11 +93,18 @@ class Player:
         :param deduct_resources: Whether to deduct the resources to build a structure from a users account.
         :param intersection: The location built on.
         :param edge: The edge built on.
+        :return: The changes made, so they can be reverted with undo_structure.
         """
+        # (resource index, count) of every card actually taken from the hand.
+        used_cards = []
         if deduct_resources:
-            for card_type, count in structure_type.required_cards().items():
-                for _ in range(count):
-                    self.use_card_of_type(card_type)
+            hand = self.hand
+            for index, count in structure_type.cost():
+                used = min(count, hand[index])
+                if used:
+                    hand[index] -= used
+                    self.hand_hash = (self.hand_hash - used * self._card_keys[index]) & HAND_HASH_MASK
+                    used_cards.append((index, used))
 
         if structure_type == Structure.Type.CITY or structure_type == Structure.Type.SETTLEMENT:
             # If a player built a settlement it adds a point.
@@ -88,6 +112,8 @@ class Player:
             # Either way they get one additional point whenever they build.
             self.add_point()
 
+        previous_network = None
+
         # Use probability of getting resource.
         match structure_type:
             case Structure.Type.SETTLEMENT:
@@ -97,15 +123,74 @@ class Player:
                 self.cities += 1
             case Structure.Type.ROAD:
                 self.roads.append(edge)
+                previous_network = self.road_network
+                self.road_network = self.road_network.add_road(edge)
 
+        # Keep the old probabilities instead of subtracting on undo, so floats come back exactly.
+        previous_probability = {}
         if intersection:
             for tile in intersection.adjacent_tiles:
+                previous_probability.setdefault(tile.type, self.resource_connections_probability[tile.type])
                 self.resource_connections[tile.type] += 1
                 self.resource_connections_probability[tile.type] += 1 * estimate_roll_probability(tile.roll)
 
+        new_locations = []
         if edge:
-            self.locations.add(edge.start.location)
-            self.locations.add(edge.end.location)
+            for location in (edge.start.location, edge.end.location):
+                if location not in self.locations:
+                    self.locations.add(location)
+                    new_locations.append(location)
+
+        return used_cards, previous_probability, new_locations, previous_network
+
+    def undo_structure(self, structure_type: Structure.Type, changes, intersection = None, edge = None):
+        """
+        Reverts made_structure.
+        :param structure_type: The structure the user made.
+        :param changes: The changes returned by made_structure.
+        :param intersection: The location built on.
+        :param edge: The edge built on.
+        """
+        used_cards, previous_probability, new_locations, previous_network = changes
+
+        for index, count in used_cards:
+            self.hand[index] += count
+            self.hand_hash = (self.hand_hash + count * self._card_keys[index]) & HAND_HASH_MASK
+
+        if structure_type == Structure.Type.CITY or structure_type == Structure.Type.SETTLEMENT:
+            self.points -= 1
+
+        match structure_type:
+            case Structure.Type.SETTLEMENT:
+                self.settlements -= 1
+            case Structure.Type.CITY:
+                self.settlements += 1
+                self.cities -= 1
+            case Structure.Type.ROAD:
+                self.roads.pop()
+                self.road_network = previous_network
+
+        if intersection:
+            for tile in intersection.adjacent_tiles:
+                self.resource_connections[tile.type] -= 1
+            self.resource_connections_probability.update(previous_probability)
+
+        for location in new_locations:
+            self.locations.remove(location)
+
+    def copy(self) -> 'Player':
+        """
+        Copies the parts of the player that change during a game.
+        Everything else (name, color, an agents settings and tables) is shared with the original.
+        :return: The copy.
+        """
+        player = copy.copy(self)
+        player.hand = list(self.hand)
+        player.resource_connections = dict(self.resource_connections)
+        player.resource_connections_probability = dict(self.resource_connections_probability)
+        player.locations = set(self.locations)
+        player.roads = list(self.roads)
+        return player
 
     def add_point(self):
         """
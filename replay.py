@@ -0,0 +1,157 @@
+import argparse
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from board import Board
+from events import EventSink
+from game import Game
+from gameManager import GameManager
+from gameRecord import GameRecord, decode_action, read_records
+from player import Player
+
+# Empty boards by layout, copied for every replay of a game (copies share the topology, so they're cheap).
+# Only the most recently used ones are kept.
+_boards: 'OrderedDict[tuple, Board]' = OrderedDict()
+MAX_CACHED_BOARDS = 64
+
+def empty_board(layout: List[Tuple]) -> Board:
+    """
+    :param layout: The board layout (see Board.layout).
+    :return: A new empty board with that layout.
+    """
+    key = tuple(layout)
+    board = _boards.get(key)
+    if board is None:
+        board = Board.from_layout(layout)
+        _boards[key] = board
+        if len(_boards) > MAX_CACHED_BOARDS:
+            _boards.popitem(last=False)
+    else:
+        _boards.move_to_end(key)
+    return board.copy()
+
+class ReplayGameManager(GameManager):
+    """
+    Plays a recorded game back: the recorded actions and rolls go through the same game manager rules as the
+    real game, without any agents (so no searching). The players are plain Players with the recorded ids.
+    """
+    def __init__(self, record: GameRecord, events: EventSink = None):
+        """
+        :param record: The game to play back.
+        :param events: Where to send the game's events (see events.py). Quiet if not given.
+        """
+        board = empty_board(record.layout)
+        players = [Player(player_id, (0, 0, 0)) for player_id in record.players]
+        super().__init__(Game(board, players, shuffle_players=False), events)
+
+        self.record = record
+
+    @property
+    def moves(self) -> int:
+        """
+        :return: The number of recorded actions played back so far.
+        """
+        return len(self.history)
+
+    def roll_dice(self, roll_value: int = None):
+        """
+        Uses the next recorded roll instead of rolling.
+        """
+        super().roll_dice(self.record.rolls[len(self.rolls)])
+
+    def step(self) -> bool:
+        """
+        Plays back the next recorded action.
+        :return: False if every action was already played back.
+        """
+        if self.moves >= len(self.record.actions):
+            return False
+
+        self.handle_agent(decode_action(self.game.board, self.record.actions[self.moves]))
+        return True
+
+    def run(self, moves: Optional[int] = None):
+        """
+        Plays back the game.
+        :param moves: Stop after this many actions (from the start of the game), or None for the whole game.
+        :return: The winner (or None) and the number of actions played back.
+        """
+        end = len(self.record.actions) if moves is None else min(moves, len(self.record.actions))
+        while self.moves < end:
+            self.step()
+
+        return self.winner, self.moves
+
+def replay(record: GameRecord, moves: Optional[int] = None) -> Game:
+    """
+    Rebuilds a position of a recorded game.
+    :param record: The game.
+    :param moves: How many actions into the game, or None for the end of the game.
+    :return: The game at that point.
+    """
+    manager = ReplayGameManager(record)
+    manager.run(moves)
+    return manager.game
+
+def positions(record: GameRecord) -> Iterator[Game]:
+    """
+    Every position of a recorded game, from the start to the end (after each action).
+    The same Game is changed and yielded each time, clone it to keep a position.
+    :param record: The game.
+    :return: The game after 0, 1, 2, ... actions.
+    """
+    manager = ReplayGameManager(record)
+    yield manager.game
+    while manager.step():
+        yield manager.game
+
+def replay_results(records: List[GameRecord]) -> List[Tuple[Optional[str], int]]:
+    """
+    Plays back games to the end.
+    :param records: The games.
+    :return: The winner's id (or None) and number of actions of each game.
+    """
+    results = []
+    for record in records:
+        winner, moves = ReplayGameManager(record).run()
+        results.append((winner.id if winner else None, moves))
+    return results
+
+def main(path: str, workers: int = 1, chunk_size: int = 256):
+    """
+    Plays back every game in a records file, and prints how fast that was and who won.
+    :param path: The file (see gameRecord.write_records).
+    :param workers: The number of processes to split the games between.
+    :param chunk_size: Games sent to a worker at a time.
+    """
+    start = time.perf_counter()
+    records = list(read_records(path))
+
+    if workers == 1:
+        results = replay_results(records)
+    else:
+        chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = [result for chunk in pool.map(replay_results, chunks) for result in chunk]
+
+    games = len(results)
+    actions = sum(moves for _, moves in results)
+    win_count: Dict[str, int] = {}
+    for winner, _ in results:
+        key = winner if winner else "None"
+        win_count[key] = win_count.get(key, 0) + 1
+
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {games} games ({actions} actions) in {elapsed:.3f}s, "
+          f"{games / elapsed if elapsed else 0:.0f} games per second")
+    print(dict(sorted(win_count.items())))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays back recorded games (without the agents).")
+    parser.add_argument("path", help="A file of game records (see --records in eval.py).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to play the games back on.")
+    args = parser.parse_args()
+
+    main(args.path, args.workers)
@@ -0,0 +1,118 @@
+from typing import Dict, FrozenSet, Tuple
+
+from constants import RESOURCE_VALUES
+from edge import Edge
+from intersection import Intersection
+from tile import Tile
+
+class RoadNetwork:
+    """
+    A player's roads, grouped into connected chains with union-find (over intersection indexes).
+    Every chain keeps its ends and how valuable the resources there are, so the road chain bonus
+    the search agents use is always up to date (see bonus).
+
+    Networks never change after they're made: add_road returns a new one. Copies of a player share
+    their network, and undoing a road just puts the old network back.
+    """
+    __slots__ = ('parent', 'roads', 'neighbors', 'ends', 'values', 'tiles', 'bonus')
+
+    def __init__(self):
+        # Intersection -> parent intersection in its chain (roots are their own parent).
+        self.parent: Dict[int, int] = {}
+        # Chain root -> number of roads in the chain.
+        self.roads: Dict[int, int] = {}
+        # Intersection -> the intersections the player's roads connect it to.
+        self.neighbors: Dict[int, Tuple[int, ...]] = {}
+        # Chain root -> intersections at the ends of the chain (only one of the chain's roads touches them).
+        self.ends: Dict[int, FrozenSet[int]] = {}
+        # Chain root -> value of the resources at the chain's ends (see _end_value).
+        self.values: Dict[int, int] = {}
+        # Intersection -> the types of its tiles.
+        self.tiles: Dict[int, FrozenSet[Tile.Type]] = {}
+        # Sum of length * end value over every chain with more than one road.
+        self.bonus = 0
+
+    def find(self, index: int) -> int:
+        """
+        :param index: An intersection index the network touches.
+        :return: The root of its chain.
+        """
+        parent = self.parent
+        while parent[index] != index:
+            index = parent[index]
+        return index
+
+    def add_road(self, edge: Edge) -> 'RoadNetwork':
+        """
+        :param edge: The edge the road was built on.
+        :return: A new network with the road added.
+        """
+        network = RoadNetwork.__new__(RoadNetwork)
+        network.parent = dict(self.parent)
+        network.roads = dict(self.roads)
+        network.neighbors = dict(self.neighbors)
+        network.ends = dict(self.ends)
+        network.values = dict(self.values)
+        network.tiles = dict(self.tiles)
+        network.bonus = self.bonus
+        network._add_road(edge.start, edge.end)
+        return network
+
+    def _add_road(self, start: Intersection, end: Intersection):
+        for intersection in (start, end):
+            index = intersection.index
+            if index not in self.parent:
+                self.parent[index] = index
+                self.roads[index] = 0
+                self.neighbors[index] = ()
+                self.ends[index] = frozenset()
+                self.values[index] = 0
+                self.tiles[index] = frozenset(tile.type for tile in intersection.adjacent_tiles)
+
+        u, v = start.index, end.index
+        self.neighbors[u] += (v,)
+        self.neighbors[v] += (u,)
+
+        root, other = self.find(u), self.find(v)
+        self.bonus -= self._chain_bonus(root)
+        if other != root:
+            self.bonus -= self._chain_bonus(other)
+
+            # Union by size, so chains stay shallow.
+            if self.roads[other] > self.roads[root]:
+                root, other = other, root
+            self.parent[other] = root
+            self.roads[root] += self.roads.pop(other)
+            self.ends[root] |= self.ends.pop(other)
+            del self.values[other]
+
+        self.roads[root] += 1
+
+        ends = set(self.ends[root])
+        for index in (u, v):
+            if len(self.neighbors[index]) == 1:
+                ends.add(index)
+            else:
+                ends.discard(index)
+        self.ends[root] = frozenset(ends)
+
+        self.values[root] = self._end_value(self.ends[root])
+        self.bonus += self._chain_bonus(root)
+
+    def _end_value(self, ends: FrozenSet[int]) -> int:
+        """
+        The value of every resource next to the roads at the ends of a chain (both sides of each end road).
+        """
+        resources = set()
+        for index in ends:
+            resources |= self.tiles[index]
+            resources |= self.tiles[self.neighbors[index][0]]
+
+        return sum(RESOURCE_VALUES[resource] for resource in resources)
+
+    def _chain_bonus(self, root: int) -> int:
+        """
+        Longer chains towards valuable resources are worth more. A single road isn't a chain.
+        """
+        roads = self.roads[root]
+        return roads * self.values[root] if roads > 1 else 0
@@ -0,0 +1,173 @@
+from dataclasses import dataclass, field
+from typing import Dict
+
+@dataclass
+class SearchStats:
+    """
+    What a search agent did for its moves: one move (see Agent.search_stats), or several added together.
+    Times are in seconds. With workers, the counts and the times spent inside the search are added up over
+    every worker, so they can be more than the wall clock time of the move.
+    """
+    moves: int = 0
+    # Wall clock time of the moves.
+    time: float = 0.0
+    # Expanded nodes, by ply from the root.
+    nodes_by_depth: Dict[int, int] = field(default_factory=dict)
+    # Legal actions found at expanded nodes (so children / nodes is the branching factor).
+    children: int = 0
+    # Actions applied to the game while searching (Game.apply).
+    successors: int = 0
+    # States scored by the evaluation function.
+    evaluations: int = 0
+    # Alpha-beta cutoffs (Minimax).
+    cutoffs: int = 0
+    # Expectimax pruning: chance nodes cut by Star1 (bounds on the outcomes left), cut by Star2 (probing one move
+    # per outcome), and nodes skipped because their evaluation bounds pinned their value exactly.
+    star1_cutoffs: int = 0
+    star2_cutoffs: int = 0
+    exact_bounds: int = 0
+    # MCTS: iterations run, and nodes in the tree at the end of each move.
+    iterations: int = 0
+    tree_nodes: int = 0
+    # Transposition table lookups that found a usable entry, and ones that didn't.
+    table_hits: int = 0
+    table_misses: int = 0
+    # Moves by the deepest depth that finished.
+    completed_depths: Dict[int, int] = field(default_factory=dict)
+    # Time spent in Game.get_legal_actions, Game.apply + Game.undo, and evaluating.
+    legal_actions_time: float = 0.0
+    successor_time: float = 0.0
+    evaluation_time: float = 0.0
+
+    @property
+    def nodes(self) -> int:
+        return sum(self.nodes_by_depth.values())
+
+    @property
+    def branching_factor(self) -> float:
+        """
+        :return: The average number of legal actions at an expanded node.
+        """
+        return self.children / self.nodes if self.nodes else 0.0
+
+    @property
+    def table_hit_rate(self) -> float:
+        lookups = self.table_hits + self.table_misses
+        return self.table_hits / lookups if lookups else 0.0
+
+    def add(self, other: 'SearchStats'):
+        """
+        Adds another move's (or game's) stats to these.
+        :param other: The stats to add.
+        """
+        self.moves += other.moves
+        self.time += other.time
+        self.add_search(other)
+        for depth, moves in other.completed_depths.items():
+            self.completed_depths[depth] = self.completed_depths.get(depth, 0) + moves
+
+    def add_search(self, other: 'SearchStats'):
+        """
+        Adds only what happened inside a search (e.g. a worker's part of a move), not the moves and their time.
+        :param other: The stats to add.
+        """
+        for depth, nodes in other.nodes_by_depth.items():
+            self.nodes_by_depth[depth] = self.nodes_by_depth.get(depth, 0) + nodes
+        self.children += other.children
+        self.successors += other.successors
+        self.evaluations += other.evaluations
+        self.cutoffs += other.cutoffs
+        self.star1_cutoffs += other.star1_cutoffs
+        self.star2_cutoffs += other.star2_cutoffs
+        self.exact_bounds += other.exact_bounds
+        self.iterations += other.iterations
+        self.tree_nodes += other.tree_nodes
+        self.table_hits += other.table_hits
+        self.table_misses += other.table_misses
+        self.legal_actions_time += other.legal_actions_time
+        self.successor_time += other.successor_time
+        self.evaluation_time += other.evaluation_time
+
+    def to_dict(self) -> dict:
+        """
+        :return: The stats (and the averages worked out from them) as plain JSON friendly values.
+        """
+        return {
+            "moves": self.moves,
+            "time": self.time,
+            "nodes": self.nodes,
+            "nodes_by_depth": { str(depth): nodes for depth, nodes in sorted(self.nodes_by_depth.items()) },
+            "children": self.children,
+            "branching_factor": self.branching_factor,
+            "successors": self.successors,
+            "evaluations": self.evaluations,
+            "cutoffs": self.cutoffs,
+            "star1_cutoffs": self.star1_cutoffs,
+            "star2_cutoffs": self.star2_cutoffs,
+            "exact_bounds": self.exact_bounds,
+            "iterations": self.iterations,
+            "tree_nodes": self.tree_nodes,
+            "table_hits": self.table_hits,
+            "table_misses": self.table_misses,
+            "table_hit_rate": self.table_hit_rate,
+            "completed_depths": { str(depth): moves for depth, moves in sorted(self.completed_depths.items()) },
+            "legal_actions_time": self.legal_actions_time,
+            "successor_time": self.successor_time,
+            "evaluation_time": self.evaluation_time,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'SearchStats':
+        """
+        :param data: The result of to_dict.
+        :return: The stats.
+        """
+        return SearchStats(
+            moves=data["moves"],
+            time=data["time"],
+            nodes_by_depth={ int(depth): nodes for depth, nodes in data["nodes_by_depth"].items() },
+            children=data["children"],
+            successors=data["successors"],
+            evaluations=data["evaluations"],
+            # Missing from files written before they were counted.
+            cutoffs=data.get("cutoffs", 0),
+            star1_cutoffs=data.get("star1_cutoffs", 0),
+            star2_cutoffs=data.get("star2_cutoffs", 0),
+            exact_bounds=data.get("exact_bounds", 0),
+            iterations=data.get("iterations", 0),
+            tree_nodes=data.get("tree_nodes", 0),
+            table_hits=data["table_hits"],
+            table_misses=data["table_misses"],
+            completed_depths={ int(depth): moves for depth, moves in data["completed_depths"].items() },
+            legal_actions_time=data["legal_actions_time"],
+            successor_time=data["successor_time"],
+            evaluation_time=data["evaluation_time"]
+        )
+
+    def report(self) -> str:
+        """
+        :return: A few readable lines with the totals and averages.
+        """
+        per_move = lambda value: value / self.moves if self.moves else 0.0
+        other_time = self.time - self.legal_actions_time - self.successor_time - self.evaluation_time
+        depths = ", ".join(f"{depth}: {nodes}" for depth, nodes in sorted(self.nodes_by_depth.items()))
+
+        lines = [f"Moves: {self.moves}, {per_move(self.time) * 1000:.2f} ms per move"]
+        # Only what this kind of agent counts (MCTS has no nodes by depth, Minimax no Star1/Star2, ...).
+        if self.nodes:
+            lines += [
+                f"Nodes: {self.nodes} ({per_move(self.nodes):.1f} per move), by depth: {{{depths}}}",
+                f"Branching factor: {self.branching_factor:.2f}",
+                f"Successors: {self.successors}, evaluations: {self.evaluations}, cutoffs: {self.cutoffs}",
+            ]
+        if self.star1_cutoffs or self.star2_cutoffs or self.exact_bounds:
+            lines.append(f"Star1 cutoffs: {self.star1_cutoffs}, Star2 cutoffs: {self.star2_cutoffs}, "
+                         f"exact bounds: {self.exact_bounds}")
+        if self.iterations:
+            lines.append(f"MCTS iterations: {self.iterations} ({per_move(self.iterations):.1f} per move), "
+                         f"tree nodes: {self.tree_nodes} ({per_move(self.tree_nodes):.1f} per move)")
+        if self.table_hits or self.table_misses:
+            lines.append(f"Table hit rate: {self.table_hit_rate:.1%}")
+        lines.append(f"Time: legal actions {self.legal_actions_time:.3f}s, successors {self.successor_time:.3f}s, "
+                     f"evaluation {self.evaluation_time:.3f}s, other {other_time:.3f}s")
+        return "\n".join(lines)
@@ -1,24 +1,40 @@
 from enum import Enum
-from uuid import uuid4
+from itertools import count
 
-from tile import Tile
+from tile import Tile, RESOURCE_INDEX
+
+_ids = count()
 
 class Structure:
+    __slots__ = ('id', 'type', 'owner')
+
     class Type(Enum):
         ROAD = "Road"
         SETTLEMENT = "Settlement"
         CITY = "City"
 
         def required_cards(self):
-            if self == Structure.Type.ROAD:
-                return {Tile.Type.BRICK: 1, Tile.Type.FOREST: 1}
-            elif self == Structure.Type.SETTLEMENT:
-                return {Tile.Type.BRICK: 1, Tile.Type.FOREST: 1, Tile.Type.GRAIN: 1, Tile.Type.PASTURE: 1}
-            elif self == Structure.Type.CITY:
-                return {Tile.Type.GRAIN: 2, Tile.Type.ORE: 3}
-            return {}
+            # Shared between calls, don't modify it.
+            return REQUIRED_CARDS[self]
+
+        def cost(self):
+            """
+            The required cards as (resource index, count) pairs, to check against a count vector hand.
+            """
+            return COSTS[self]
 
     def __init__(self, tile_type: Type, owner):
-        self.id = uuid4()
+        self.id = next(_ids)
         self.type = tile_type
-        self.owner = owner
\ No newline at end of file
+        self.owner = owner
+
+REQUIRED_CARDS = {
+    Structure.Type.ROAD: {Tile.Type.BRICK: 1, Tile.Type.FOREST: 1},
+    Structure.Type.SETTLEMENT: {Tile.Type.BRICK: 1, Tile.Type.FOREST: 1, Tile.Type.GRAIN: 1, Tile.Type.PASTURE: 1},
+    Structure.Type.CITY: {Tile.Type.GRAIN: 2, Tile.Type.ORE: 3},
+}
+
+COSTS = {
+    structure_type: tuple((RESOURCE_INDEX[resource], count) for resource, count in cards.items())
+    for structure_type, cards in REQUIRED_CARDS.items()
+}
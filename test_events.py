@@ -0,0 +1,13 @@
+from events import BufferedSink
+from headlessGameManager import HeadlessGameManager, new_game
+
+def test_buffered_sink_keeps_headless_game_events():
+    sink = BufferedSink()
+    manager = HeadlessGameManager(new_game(1), sink)
+    winner, turns = manager.run()
+
+    kinds = [event["event"] for event in sink.events]
+    assert kinds.count("initial settlement") == 2 * len(manager.game.players)
+    assert kinds.count("initial road") == 2 * len(manager.game.players)
+    assert [event["roll"] for event in sink.events if event["event"] == "roll"] == manager.rolls
+    assert sink.events[-1] == { "event": "game end", "winner": winner.id if winner else None, "turns": turns }
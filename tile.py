@@ -1,7 +1,12 @@
 from enum import Enum
-from uuid import uuid4
+from itertools import count
+
+# Cheap unique ids (uuid4 was slow and the ids are never looked up).
+_ids = count()
 
 class Tile:
+    __slots__ = ('id', 'type', 'roll')
+
     class Type(Enum):
         FOREST = "Forest"
         PASTURE = "Pasture"
@@ -11,6 +16,10 @@ class Tile:
         DESERT = "Desert"
 
     def __init__(self, tile_type: Type, roll: int):
-        self.id = uuid4()
+        self.id = next(_ids)
         self.type = tile_type
         self.roll = roll
+
+# Where each resource sits in a count vector (e.g. Player.hand).
+RESOURCE_TYPES = list(Tile.Type)
+RESOURCE_INDEX = {resource: index for index, resource in enumerate(RESOURCE_TYPES)}
@@ -0,0 +1,54 @@
+from typing import Dict, Tuple
+
+from edge import Edge
+from intersection import Intersection
+from location import Location
+from tile import Tile
+
+Coordinate = Tuple[int, int]
+
+class Topology:
+    """
+    The parts of a board that never change once it's made: the tiles, where everything is,
+    and how intersections and edges connect. One Topology is shared by every copy of a Board,
+    so copying a board (or a game) only copies the structures and roads.
+    """
+    def __init__(
+        self,
+        grid: Dict[Coordinate, Tile],
+        edges: Dict[Location, Edge],
+        intersections: Dict[Location, Intersection]
+    ):
+        self.grid = grid
+        self.edges = edges
+        self.intersections = intersections
+
+        # Every intersection/edge gets an integer index, which is its bit in the board's masks.
+        self.intersection_list = list(self.intersections.values())
+        self.edge_list = list(self.edges.values())
+
+        for index, intersection in enumerate(self.intersection_list):
+            intersection.index = index
+        for index, edge in enumerate(self.edge_list):
+            edge.index = index
+
+        # Neighbouring intersections, edges touching an intersection,
+        # both ends of an edge, and edges sharing an end with an edge.
+        self.intersection_neighbors = [0] * len(self.intersection_list)
+        self.intersection_edges = [0] * len(self.intersection_list)
+        self.edge_ends = [0] * len(self.edge_list)
+        self.edge_neighbors = [0] * len(self.edge_list)
+
+        for intersection in self.intersection_list:
+            for adj_intersection in intersection.adjacent_intersections:
+                self.intersection_neighbors[intersection.index] |= 1 << adj_intersection.index
+
+            for edge in intersection.edges:
+                self.intersection_edges[intersection.index] |= 1 << edge.index
+
+        for edge in self.edge_list:
+            self.edge_ends[edge.index] = (1 << edge.start.index) | (1 << edge.end.index)
+            for adj_edge in edge.adjacent_edges:
+                self.edge_neighbors[edge.index] |= 1 << adj_edge.index
+
+        self.all_intersections = (1 << len(self.intersection_list)) - 1
@@ -0,0 +1,309 @@
+import argparse
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from agent import Agent, MinimaxAgent, ExpectimaxAgent, MCTSAgent
+from eval import run_game
+from headlessGameManager import PLAYERS
+
+# Everyone starts here, and ratings are moved by K times how much better or worse than expected a game went.
+START_RATING = 1500
+K_FACTOR = 16
+
+@dataclass
+class AgentConfig:
+    """
+    An agent to enter in a tournament: a name (also the player id in its games), the agent class and the options
+    to make it with. Only plain data, so it can be sent to worker processes.
+    """
+    name: str
+    agent_class: type
+    options: Dict = field(default_factory=dict)
+
+    def make(self, color: Tuple[int, int, int], rng: random.Random) -> Agent:
+        """
+        :param color: The player's color.
+        :param rng: The agent's random number generator.
+        :return: A new agent.
+        """
+        return self.agent_class(self.name, color, rng=rng, **self.options)
+
+# The configurations the command line can pick from, by name.
+CONFIGS = { config.name: config for config in [
+    AgentConfig("minimax", MinimaxAgent, { "max_depth": 2 }),
+    AgentConfig("minimax-1", MinimaxAgent, { "max_depth": 1 }),
+    AgentConfig("expectimax", ExpectimaxAgent, { "max_depth": 1 }),
+    AgentConfig("mcts", MCTSAgent, { "iterations": 200 }),
+]}
+
+def expected_score(elo: float) -> float:
+    """
+    :param elo: How many Elo points better one player is than the other.
+    :return: The score (1 for a win, 0.5 for a draw, 0 for a loss) that player should get on average.
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def elo_difference(score: float) -> float:
+    """
+    The opposite of expected_score.
+    :param score: A player's average score.
+    :return: How many Elo points better than its opponent that makes it (infinite for 0 or 1).
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+@dataclass
+class SPRT:
+    """
+    Sequential probability ratio test of which of two players is stronger: H0 is the first player being
+    `elo` points weaker, H1 is it being `elo` points stronger. After every game the log likelihood ratio of the
+    two is updated, and the test stops as soon as it's past one of the bounds. Draws count as half a win.
+    With players closer than `elo`, it can take a while (that's what the max games of a pairing is for).
+    """
+    elo: float = 50
+    # Chance of saying the first player is stronger when it's really the weaker one (alpha), and the other way (beta).
+    alpha: float = 0.05
+    beta: float = 0.05
+
+    def bounds(self) -> Tuple[float, float]:
+        """
+        :return: The log likelihood ratio to accept H0 at (or below) and to accept H1 at (or above).
+        """
+        return math.log(self.beta / (1 - self.alpha)), math.log((1 - self.beta) / self.alpha)
+
+    def llr(self, score: float, games: int) -> float:
+        """
+        :param score: The first player's total score.
+        :param games: The number of games played.
+        :return: The log likelihood ratio of H1 to H0.
+        """
+        p0 = expected_score(-self.elo)
+        p1 = expected_score(self.elo)
+        return score * math.log(p1 / p0) + (games - score) * math.log((1 - p1) / (1 - p0))
+
+    def decide(self, score: float, games: int) -> Optional[bool]:
+        """
+        :param score: The first player's total score.
+        :param games: The number of games played.
+        :return: True if the first player is stronger, False if the second one is, None to keep playing.
+        """
+        lower, upper = self.bounds()
+        llr = self.llr(score, games)
+        if llr >= upper:
+            return True
+        if llr <= lower:
+            return False
+        return None
+
+@dataclass
+class Pairing:
+    """
+    The games between two agents so far, from the first agent's side.
+    """
+    first: AgentConfig
+    second: AgentConfig
+    # Where this pairing's game seeds start (game i is seeded with seed + i).
+    seed: int
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+    # The stronger agent's name once the test decided, "inconclusive" if it ran out of games.
+    decision: Optional[str] = None
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.draws + self.losses
+
+    @property
+    def score(self) -> float:
+        """
+        :return: The first agent's total score.
+        """
+        return self.wins + self.draws / 2
+
+    def add(self, score: float):
+        """
+        :param score: The first agent's score in a finished game.
+        """
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+def play_pairing_game(first: AgentConfig, second: AgentConfig, seed: int) -> float:
+    """
+    Plays a game between two agents (in a worker process, or here when there's only one worker).
+    Turn order is shuffled by the game, from the seed.
+    :return: The first agent's score (1 for a win, 0.5 if nobody won, 0 for a loss).
+    """
+    winner, _, _, _ = run_game(seed, agents=[partial(first.make, PLAYERS[0][1]), partial(second.make, PLAYERS[1][1])])
+    if winner is None:
+        return 0.5
+    return 1 if winner.id == first.name else 0
+
+class Tournament:
+    """
+    Round robin between any number of agents. Each pairing plays until its SPRT decides which of the two is
+    stronger (or it runs out of games), so games go to the pairings that are still close. Every game also moves
+    the two agents' Elo ratings.
+
+    Games are played in rounds: a few games of every undecided pairing at a time, so a pool of workers always has
+    something to do. The results are added in a fixed order (pairing, then game), so ratings and decisions only
+    depend on the seed, not on the number of workers.
+    """
+    def __init__(
+        self,
+        configs: List[AgentConfig],
+        seed: int = 0,
+        sprt: Optional[SPRT] = None,
+        min_games: int = 10,
+        max_games: int = 400,
+        games_per_round: int = 4
+    ):
+        """
+        :param configs: The agents (their names must be different).
+        :param seed: Where the game seeds start. Pairing k's game i is seeded with seed + k * max_games + i.
+        :param sprt: The test each pairing stops with.
+        :param min_games: Games every pairing plays before the test can stop it.
+        :param max_games: Games after which a pairing stops undecided.
+        :param games_per_round: Games played for every undecided pairing in a round.
+        """
+        names = [config.name for config in configs]
+        assert len(set(names)) == len(names), f"Agent names must be different: {names}"
+        assert len(configs) >= 2, "A tournament needs at least two agents"
+
+        self.configs = configs
+        self.sprt = sprt or SPRT()
+        self.min_games = min_games
+        self.max_games = max_games
+        self.games_per_round = games_per_round
+
+        self.pairings = [
+            Pairing(first, second, seed + index * max_games)
+            for index, (first, second) in enumerate(combinations(configs, 2))
+        ]
+        self.ratings: Dict[str, float] = { config.name: START_RATING for config in configs }
+
+    def update_ratings(self, first: str, second: str, score: float):
+        """
+        :param first: One agent's name.
+        :param second: The other's.
+        :param score: The first agent's score in the game.
+        """
+        change = K_FACTOR * (score - expected_score(self.ratings[first] - self.ratings[second]))
+        self.ratings[first] += change
+        self.ratings[second] -= change
+
+    def add(self, pairing: Pairing, score: float):
+        """
+        Adds a finished game of an undecided pairing, and stops the pairing if that decides it.
+        :param pairing: The pairing.
+        :param score: The first agent's score.
+        """
+        pairing.add(score)
+        self.update_ratings(pairing.first.name, pairing.second.name, score)
+
+        if pairing.games >= self.min_games:
+            stronger = self.sprt.decide(pairing.score, pairing.games)
+            if stronger is not None:
+                pairing.decision = pairing.first.name if stronger else pairing.second.name
+        if pairing.decision is None and pairing.games >= self.max_games:
+            pairing.decision = "inconclusive"
+
+        if pairing.decision is not None:
+            print(f"-- {pairing.first.name} vs {pairing.second.name} -- {pairing.decision} "
+                  f"after {pairing.games} games (+{pairing.wins} ={pairing.draws} -{pairing.losses})")
+
+    def run(self, workers: int = 1):
+        """
+        Plays until every pairing is decided.
+        :param workers: The number of processes to run games on. 1 runs them here, one at a time.
+        """
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            while True:
+                games = []
+                for pairing in self.pairings:
+                    if pairing.decision is None:
+                        count = min(self.games_per_round, self.max_games - pairing.games)
+                        games += [(pairing, pairing.seed + pairing.games + i) for i in range(count)]
+                if not games:
+                    break
+
+                args = ([pairing.first for pairing, _ in games], [pairing.second for pairing, _ in games],
+                        [game_seed for _, game_seed in games])
+                scores = pool.map(play_pairing_game, *args) if pool else map(play_pairing_game, *args)
+
+                for (pairing, _), score in zip(games, scores):
+                    # Games of the round played after the pairing was decided don't count.
+                    if pairing.decision is None:
+                        self.add(pairing, score)
+        finally:
+            if pool:
+                pool.shutdown()
+
+    def report(self):
+        """
+        Prints the ratings and every pairing's result.
+        """
+        print("\n-- RATINGS --")
+        for name, rating in sorted(self.ratings.items(), key=lambda item: -item[1]):
+            print(f"{name}: {rating:.0f}")
+
+        print("\n\n-- PAIRINGS --")
+        for pairing in self.pairings:
+            elo = elo_difference(pairing.score / pairing.games)
+            print(f"{pairing.first.name} vs {pairing.second.name}: +{pairing.wins} ={pairing.draws} -{pairing.losses} "
+                  f"({pairing.games} games, {elo:+.0f} Elo, LLR {self.sprt.llr(pairing.score, pairing.games):.2f}) "
+                  f"-> {pairing.decision}")
+
+def main(names: List[str], workers: int = 1, seed: Optional[int] = None, **options):
+    """
+    Runs a tournament between configurations in CONFIGS and prints the results.
+    :param names: The configurations' names.
+    :param workers: The number of processes to run games on.
+    :param seed: Where the game seeds start. Random if not given.
+    :param options: Passed on to Tournament.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    print(f"Seed: {seed}")
+
+    tournament = Tournament([CONFIGS[name] for name in names], seed, **options)
+    start = time.perf_counter()
+    tournament.run(workers)
+    games = sum(pairing.games for pairing in tournament.pairings)
+    print(f"\n{games} games in {time.perf_counter() - start:.1f}s")
+    tournament.report()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round robin between agents, each pairing stopped early by an SPRT.")
+    parser.add_argument("agents", nargs="*",
+                        help=f"The agents to play, from {', '.join(CONFIGS)} (all of them if not given).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to run games on.")
+    parser.add_argument("--seed", type=int, default=None, help="Where the game seeds start (random if not given).")
+    parser.add_argument("--elo", type=float, default=50,
+                        help="The test decides which agent is stronger, assuming they're at least this far apart.")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Chance of picking the weaker agent of a pairing.")
+    parser.add_argument("--beta", type=float, default=0.05, help="Chance of picking the weaker agent, the other way.")
+    parser.add_argument("--min-games", type=int, default=10, help="Games every pairing plays before it can stop.")
+    parser.add_argument("--max-games", type=int, default=400, help="Games after which a pairing stops undecided.")
+    parser.add_argument("--games-per-round", type=int, default=4, help="Games scheduled per undecided pairing at a time.")
+    args = parser.parse_args()
+    unknown = [name for name in args.agents if name not in CONFIGS]
+    if unknown:
+        parser.error(f"unknown agents: {', '.join(unknown)}")
+
+    main(args.agents or list(CONFIGS), args.workers, args.seed, sprt=SPRT(args.elo, args.alpha, args.beta), min_games=args.min_games,
+         max_games=args.max_games, games_per_round=args.games_per_round)
@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from enum import Enum
+from itertools import count
+from typing import Optional, List
+
+from action import Action
+
+# Unique id per table (search workers keep their own copy of each table, see parallel.py).
+_ids = count()
+
+class TranspositionTable:
+    """
+    A fixed size table of search results keyed by Game.zobrist_hash().
+    Each key maps to one slot (key % size). When two positions want the same slot the
+    deeper search wins, unless the stored one is left over from an earlier move.
+    """
+    class Flag(Enum):
+        # The score is the real value.
+        EXACT = "Exact"
+        # The real value is at least the score.
+        LOWER = "Lower"
+        # The real value is at most the score.
+        UPPER = "Upper"
+
+    @dataclass
+    class Entry:
+        key: int
+        depth: int
+        score: float
+        action: Optional[Action]
+        flag: 'TranspositionTable.Flag'
+        generation: int
+
+    def __init__(self, size: int = 2 ** 16):
+        assert size > 0
+
+        self.id = next(_ids)
+        self.size = size
+        self.slots: List[Optional[TranspositionTable.Entry]] = [None] * size
+        self.generation = 0
+
+        # Lookups that found a usable entry and ones that didn't (read by the search agents' SearchStats).
+        self.hits = 0
+        self.misses = 0
+
+    def new_search(self):
+        """
+        Called at the start of every move. Entries from earlier moves can always be replaced.
+        """
+        self.generation += 1
+
+    def lookup(self, key: int, depth: int) -> Optional[Entry]:
+        """
+        Finds a stored result for a position that was searched at least as deep as needed.
+
+        :param key: The position hash.
+        :param depth: The remaining depth the caller wants to search.
+        :return: The entry, or None on a miss.
+        """
+        entry = self.slots[key % self.size]
+        if entry is not None and entry.key == key and entry.depth >= depth:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return None
+
+    def probe(self, key: int) -> Optional[Entry]:
+        """
+        Finds a stored entry for a position regardless of its depth (e.g. to get its best action).
+        Doesn't count towards the hit/miss stats.
+
+        :param key: The position hash.
+        :return: The entry, or None.
+        """
+        entry = self.slots[key % self.size]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, score: float, action: Optional[Action], flag: Flag = Flag.EXACT):
+        """
+        Stores a search result, following the replacement policy.
+
+        :param key: The position hash.
+        :param depth: The remaining depth that was searched.
+        :param score: The score found.
+        :param action: The best action found, if any.
+        :param flag: Whether the score is exact or a bound.
+        """
+        index = key % self.size
+        current = self.slots[index]
+
+        if current is not None and current.key != key:
+            if current.generation == self.generation and current.depth > depth:
+                return
+
+        self.slots[index] = TranspositionTable.Entry(key, depth, score, action, flag, self.generation)
+
+    def clear(self):
+        """
+        Empties the table and resets the stats.
+        """
+        self.__init__(self.size)
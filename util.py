@@ -1,4 +1,5 @@
 import math
+import random
 from collections import Counter
 from itertools import product
 
@@ -33,3 +34,34 @@ def estimate_roll_probability(roll):
     probability = total_counts[roll] / total_possibilities if roll in total_counts else 0.0
     ROLL_PROBABILITIES[roll] = probability
     return probability
+
+def iterate_bits(mask: int):
+    """
+    Iterates the indexes of all the set bits in a mask, lowest first.
+
+    :param mask: The bitmask.
+    :return: A generator of bit indexes.
+    """
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+def roll_dice(rng: random.Random) -> int:
+    """
+    Rolls two dice.
+    :param rng: The random number generator to roll with.
+    :return: The total.
+    """
+    return rng.randint(1, 6) + rng.randint(1, 6)
+
+def derive_rng(rng: random.Random) -> random.Random:
+    """
+    Makes a new random number generator, seeded from another one. Lets one seed set up a whole game
+    (board, dice and agents) while each part still has its own stream, so e.g. a change to how much
+    an agent searches doesn't change the dice.
+
+    :param rng: The generator to seed from.
+    :return: The new generator.
+    """
+    return random.Random(rng.getrandbits(64))
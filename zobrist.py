@@ -0,0 +1,24 @@
+import hashlib
+
+_keys = {}
+
+def zobrist_key(*parts) -> int:
+    """
+    Gets the random 64 bit key for one piece of game state, e.g. ("road", edge index, player id).
+    Keys are made the first time they're asked for and reused after that.
+
+    :param parts: Anything hashable (with a repr that's the same every run) that describes the piece of state.
+    :return: The key.
+    """
+    key = _keys.get(parts)
+    if key is None:
+        # Made from the parts themselves instead of the order they're asked for, so keys are the same
+        # every run and in every process (search workers hash positions the same way as the main process).
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+        key = int.from_bytes(digest, "little")
+        _keys[parts] = key
+    return key
+
+# Hands are multisets of cards, so they're hashed by adding keys (mod 2^64) instead of xor-ing them.
+# That way adding/removing a card is one addition/subtraction and the order of the cards doesn't matter.
+HAND_HASH_MASK = (1 << 64) - 1